@@ -0,0 +1,83 @@
+"""Benchmark the writing of fasta files.
+
+Compare `Fasta.to_fasta_file` with the previous implementation building a list
+of lines for each sequence. Run with `python benchmarks/bench_fasta_writer.py`.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from data_assembly.fasta import Fasta
+from data_assembly.sequence_store import SequenceStore
+
+
+def write_lines(fasta: Fasta, output_path: Path):
+    """Write a fasta file as `to_fasta_file` did before the output buffer."""
+    with output_path.open("w+") as f:
+        for title, seq in zip(fasta.titles, fasta.sequences, strict=True):
+            title = f">{title}"
+            sequences = [
+                seq[i : min(i + 50, len(seq))] + "\n" for i in range(0, len(seq), 50)
+            ]
+            f.writelines([title + "\n", *sequences])
+
+
+def bench(name: str, write, genome_len: int, repeat: int):
+    """Print the best throughput of `write` over `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        write()
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<24}{best * 1e3:10.1f} ms{genome_len / best / 1e6:10.1f} Mb/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=float, default=10e6, help="Genome length.")
+    parser.add_argument("--contigs", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    contig_len = int(args.size) // args.contigs
+    sequences = [
+        "".join(rng.choices("ACGT", k=contig_len)) for _ in range(args.contigs)
+    ]
+    titles = [f"contig_{i}" for i in range(args.contigs)]
+    fasta = Fasta(sequences, titles)
+    stored = Fasta(SequenceStore.from_sequences(sequences), titles)
+    genome_len = contig_len * args.contigs
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = Path(tmp_dir) / Path("genome.fna")
+        bench(
+            "list of lines",
+            lambda: write_lines(fasta, output_path),
+            genome_len,
+            args.repeat,
+        )
+        bench(
+            "to_fasta_file",
+            lambda: fasta.to_fasta_file(output_path),
+            genome_len,
+            args.repeat,
+        )
+        bench(
+            "to_fasta_file (bytes)",
+            lambda: stored.to_fasta_file(output_path),
+            genome_len,
+            args.repeat,
+        )
+        bench(
+            "to_fasta_file (gzip 1)",
+            lambda: fasta.to_fasta_file(output_path, compresslevel=1),
+            genome_len,
+            args.repeat,
+        )
+
+
+if __name__ == "__main__":
+    main()
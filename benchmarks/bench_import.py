@@ -0,0 +1,120 @@
+"""Benchmark the import of the modules of the package.
+
+Each module is imported in a fresh interpreter with `-X importtime`, and the
+best cumulative import time over the runs is reported with the modules the
+import pulled in the most time. Worker processes import these modules when
+they start, so a slow import slows down every batch. The standard modules of
+`PRELOAD` are imported first, so that the time is what the package adds to
+them, and the script fails when it exceeds the budget of the module in
+`BUDGETS_MS`, or `--max-ms` when given, to guard it in CI. Run with
+`python benchmarks/bench_import.py`.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+MODULES = [
+    "data_assembly.fasta",
+    "data_assembly.qc",
+    "data_assembly.pgap",
+    "data_assembly.scheduler",
+    "data_assembly.cli",
+]
+# Budgets of the import of each module, in milliseconds, about twice the
+# time they take so that only a regression makes them fail.
+BUDGETS_MS = {
+    "data_assembly.fasta": 10.0,
+    "data_assembly.qc": 60.0,
+    "data_assembly.pgap": 45.0,
+    "data_assembly.scheduler": 120.0,
+    "data_assembly.cli": 90.0,
+}
+# Modules imported by any module of the package, before the one measured.
+PRELOAD = ["logging", "pathlib", "re", "typing"]
+# Line written between the import of `PRELOAD` and the module measured.
+PRELOADED = "preloaded"
+SRC_DIR = Path(__file__).parents[1] / Path("src")
+
+
+def import_times(module: str, pycache_dir: Path) -> dict[str, int]:
+    """Import a module in a fresh interpreter and get the cumulative import
+    time of each module imported, in microseconds, after `PRELOAD`.
+
+    The bytecode is written in `pycache_dir`, so that only the first import
+    compiles the modules.
+    """
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=str(pycache_dir))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(SRC_DIR), *filter(None, [env.get("PYTHONPATH")])]
+    )
+    stderr = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import {', '.join(PRELOAD)}, sys; "
+            f"print({PRELOADED!r}, file=sys.stderr); import {module}",
+        ],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = {}
+    for line in stderr.split(f"{PRELOADED}\n")[1].splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports shown.")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="Fail if an import takes longer than this, instead of its budget.",
+    )
+    parser.add_argument("--output", type=Path, help="File to write the results in.")
+    args = parser.parse_args()
+
+    results = {}
+    n_slow = 0
+    with tempfile.TemporaryDirectory(prefix="bench_import_") as pycache_dir:
+        for module in args.modules:
+            runs = [import_times(module, Path(pycache_dir)) for _ in range(args.repeat)]
+            best = min(runs, key=lambda times: times[module])
+            milliseconds = best[module] / 1e3
+            results[module] = milliseconds
+            print(f"{module:<32}{milliseconds:8.1f} ms", flush=True)
+            slowest = sorted(
+                (item for item in best.items() if item[0] != module),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+            for name, cumulative in slowest[: args.top]:
+                print(f"    {name:<28}{cumulative / 1e3:8.1f} ms")
+            max_ms = args.max_ms if args.max_ms is not None else BUDGETS_MS.get(module)
+            if max_ms is not None and milliseconds > max_ms:
+                n_slow += 1
+                print(f"{module} imports in more than {max_ms} ms", file=sys.stderr)
+
+    if args.output is not None:
+        with args.output.open("w+") as f:
+            json.dump(results, f, indent=2)
+    return 1 if n_slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
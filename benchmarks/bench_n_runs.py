@@ -0,0 +1,85 @@
+"""Benchmark the collapsing of runs of N.
+
+Compare `collapse_n_runs` with the previous loop over each base of a contig,
+without its debug log, on contigs with more and more scaffold gaps. When gaps
+make most of the contig, both spend their time going through the N and the
+speedup drops under 50x. With `--min-speedup` the script fails when
+`collapse_n_runs` is not that many times faster, to guard it in CI. Run with
+`python benchmarks/bench_n_runs.py`.
+"""
+
+import argparse
+import random
+import sys
+import time
+from data_assembly.fasta import N_RUN_LIMIT, collapse_n_runs
+from synthetic import random_contig
+
+
+def collapse_loop(seq: str, limit: int = N_RUN_LIMIT) -> str:
+    """Collapse the runs of N as `reduce_successives_n` did before the regex."""
+    n_id = 0
+    new_seq = ""
+    for elem in seq:
+        if elem == "N":
+            n_id += 1
+        else:
+            n_id = 0
+        if n_id <= limit:
+            new_seq += elem
+    return new_seq
+
+
+def best_time(collapse, seq: str, repeat: int) -> float:
+    """Get the best time of `collapse` on `seq` over `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        collapse(seq)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=float, default=5e6, help="Contig length.")
+    parser.add_argument(
+        "--gap-densities",
+        type=float,
+        nargs="+",
+        default=[0.1, 1.0],
+        help="Gaps by kilobase.",
+    )
+    parser.add_argument("--max-gap-len", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-speedup", type=float, help="Fail if the speedup is lower than this."
+    )
+    args = parser.parse_args()
+
+    n_slow = 0
+    for gap_density in args.gap_densities:
+        seq = random_contig(
+            random.Random(0), int(args.size), gap_density, args.max_gap_len
+        )
+        if collapse_n_runs(seq) != collapse_loop(seq):
+            raise ValueError(f"collapse_n_runs differs at {gap_density} gaps by kb")
+        loop = best_time(collapse_loop, seq, 1)
+        regex = best_time(collapse_n_runs, seq, args.repeat)
+        speedup = loop / regex
+        print(
+            f"{gap_density:6.1f} gaps/kb{loop * 1e3:10.1f} ms{regex * 1e3:10.1f} ms"
+            f"{speedup:8.1f}x"
+        )
+        if args.min_speedup is not None and speedup < args.min_speedup:
+            n_slow += 1
+            print(
+                f"collapse_n_runs is less than {args.min_speedup}x faster at "
+                f"{gap_density} gaps by kb",
+                file=sys.stderr,
+            )
+    return 1 if n_slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
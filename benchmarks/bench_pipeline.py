@@ -0,0 +1,177 @@
+"""Benchmark the cleaning of genomes and the preparation of PGAP inputs.
+
+Each stage runs in its own process on synthetic inputs, see `synthetic.py`,
+and its best time, throughput and peak resident memory are reported. Results
+are written in `benchmarks/results/<version>.json` so that versions can be
+compared with `--compare`. Run with `python benchmarks/bench_pipeline.py`.
+"""
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import NamedTuple
+from data_assembly.fasta import Fasta, parse_genome
+from data_assembly.pgap import get_pgap_inputs
+from synthetic import random_genome, write_assembly_summary
+
+RESULTS_DIR = Path(__file__).parent / Path("results")
+
+
+class BenchInputs(NamedTuple):
+    """Files the stages run on."""
+
+    genome_path: Path
+    genome_len: int
+    out_dir: Path
+    genome_dir: Path
+    tsv_path: Path
+    rows: int
+
+
+def parse(inputs: BenchInputs) -> Fasta:
+    return Fasta.from_fasta_file(inputs.genome_path)
+
+
+# Each stage is a setup, not timed, and a run given what the setup returned.
+STAGES = {
+    "from_fasta_file": (lambda inputs: inputs, parse),
+    "remove_first_last_n": (parse, Fasta.remove_first_last_n),
+    "reduce_successives_n": (parse, Fasta.reduce_successives_n),
+    "remove_all_n_seq": (parse, Fasta.remove_all_n_seq),
+    "remove_seq_too_short": (parse, Fasta.remove_seq_too_short),
+    "to_fasta_file": (
+        lambda inputs: (parse(inputs), inputs.out_dir / Path("genome.fna")),
+        lambda args: args[0].to_fasta_file(args[1]),
+    ),
+    "parse_genome": (
+        lambda inputs: (inputs.genome_path, inputs.out_dir),
+        parse_genome,
+    ),
+    "get_pgap_inputs": (
+        lambda inputs: inputs,
+        lambda inputs: get_pgap_inputs(inputs.genome_dir, inputs.tsv_path),
+    ),
+}
+
+
+def run_stage(name: str, inputs: BenchInputs, repeat: int) -> dict:
+    """Run a stage `repeat` times and measure its best time and peak memory."""
+    setup, run = STAGES[name]
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup(inputs)
+        start = time.perf_counter()
+        run(arg)
+        best = min(best, time.perf_counter() - start)
+    if name == "get_pgap_inputs":
+        throughput, unit = inputs.rows / best, "rows/s"
+    else:
+        throughput, unit = inputs.genome_len / best / 1e6, "Mb/s"
+    return {
+        "seconds": best,
+        "throughput": throughput,
+        "unit": unit,
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3,
+    }
+
+
+def get_version() -> str:
+    """Get the version of the code benchmarked from git."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=float, default=10e6, help="Genome length.")
+    parser.add_argument("--contigs", type=int, default=100)
+    parser.add_argument(
+        "--gap-density", type=float, default=0.1, help="Gaps of N by kilobase."
+    )
+    parser.add_argument(
+        "--rows", type=int, default=50000, help="Rows of the assembly summary."
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--stages", nargs="+", choices=list(STAGES), default=list(STAGES)
+    )
+    parser.add_argument("--output", type=Path, help="File to write the results in.")
+    parser.add_argument("--compare", type=Path, help="Results to compare with.")
+    args = parser.parse_args()
+
+    version = get_version()
+    results = {
+        "version": version,
+        "python": platform.python_version(),
+        "time": time.time(),
+        "params": {
+            "size": args.size,
+            "contigs": args.contigs,
+            "gap_density": args.gap_density,
+            "rows": args.rows,
+            "repeat": args.repeat,
+        },
+        "stages": {},
+    }
+    previous = {}
+    if args.compare is not None:
+        with args.compare.open("r") as f:
+            previous = json.load(f)["stages"]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        genome_path = tmp_dir / Path("GCF_000000001.1_genomic.fna")
+        genome = random_genome(int(args.size), args.contigs, args.gap_density)
+        genome.to_fasta_file(genome_path)
+        genome_len = sum(map(len, genome.sequences))
+        del genome
+        out_dir = tmp_dir / Path("out")
+        out_dir.mkdir()
+        tsv_path = tmp_dir / Path("summary.tsv")
+        genome_dir = tmp_dir / Path("genomes")
+        write_assembly_summary(tsv_path, genome_dir, args.rows)
+        inputs = BenchInputs(
+            genome_path, genome_len, out_dir, genome_dir, tsv_path, args.rows
+        )
+
+        print(f"{'stage':<24}{'time':>12}{'throughput':>20}{'peak RSS':>12}")
+        for name in args.stages:
+            # A fresh process for each stage so that its peak memory is its own.
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+                stage = executor.submit(run_stage, name, inputs, args.repeat).result()
+            results["stages"][name] = stage
+            line = (
+                f"{name:<24}{stage['seconds'] * 1e3:9.1f} ms"
+                f"{stage['throughput']:12.1f} {stage['unit']:<7}"
+                f"{stage['peak_rss_mb']:9.1f} MB"
+            )
+            if name in previous:
+                line += f"{stage['seconds'] / previous[name]['seconds']:8.2f}x"
+            print(line, flush=True)
+
+    output_path = args.output or RESULTS_DIR / Path(f"{version}.json")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w+") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written in {output_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
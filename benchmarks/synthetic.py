@@ -0,0 +1,77 @@
+"""Synthetic inputs for the benchmarks.
+
+Genomes are random nucleotides cut in contigs, with runs of N standing for
+scaffold gaps and for the N padding some assemblers leave at contig ends.
+Everything is drawn from a seeded generator so that runs are reproducible.
+"""
+
+import random
+from pathlib import Path
+from data_assembly.fasta import Fasta
+
+
+def random_contig(
+    rng: random.Random, contig_len: int, gap_density: float, max_gap_len: int
+) -> str:
+    """Draw a contig with about `gap_density` gaps by kilobase."""
+    n_gaps = round(gap_density * contig_len / 1e3)
+    positions = sorted(rng.randrange(contig_len) for _ in range(n_gaps))
+    chunks = ["N" * rng.randint(0, 20)]
+    previous = 0
+    for position in positions:
+        chunks.append("".join(rng.choices("ACGT", k=position - previous)))
+        chunks.append("N" * rng.randint(1, max_gap_len))
+        previous = position
+    chunks.append("".join(rng.choices("ACGT", k=contig_len - previous)))
+    chunks.append("N" * rng.randint(0, 20))
+    return "".join(chunks)
+
+
+def random_genome(
+    size: int,
+    contigs: int,
+    gap_density: float = 0.1,
+    max_gap_len: int = 500,
+    seed: int = 0,
+) -> Fasta:
+    """Draw a genome of about `size` nucleotides in `contigs` contigs.
+
+    One contig out of ten is shorter than the minimal sequence length so that
+    the filtering of short contigs has work to do.
+    """
+    rng = random.Random(seed)
+    contig_len = size // contigs
+    sequences = [
+        random_contig(
+            rng,
+            contig_len if i % 10 else min(contig_len, 1000),
+            gap_density,
+            max_gap_len,
+        )
+        for i in range(contigs)
+    ]
+    titles = [f"contig_{i} synthetic contig" for i in range(contigs)]
+    return Fasta(sequences, titles)
+
+
+def write_assembly_summary(tsv_path: Path, genome_dir: Path, rows: int, seed: int = 0):
+    """Write an assembly summary of `rows` genomes and their empty genome files.
+
+    Half of the genomes are listed both as GCA and GCF, like in the summaries
+    downloaded from NCBI, and one genome out of ten has no genome file.
+    """
+    rng = random.Random(seed)
+    genome_dir.mkdir(parents=True, exist_ok=True)
+    with tsv_path.open("w+") as f:
+        f.write(
+            "\t".join(["id", "accession", "paired", "organism", "", "", "", "strain"])
+            + "\n"
+        )
+        for i in range(rows):
+            gcf, gca = f"GCF_{i:09d}.1", f"GCA_{i:09d}.1"
+            organism = f"Thermococcus sp. {rng.randrange(rows)}"
+            f.write(f"{i}\t{gcf}\t{gca}\t{organism}\t\t\t\tstrain_{i}\n")
+            if i % 2:
+                f.write(f"{i}\t{gca}\t{gcf}\t{organism}\t\t\t\tstrain_{i}\n")
+            if i % 10:
+                (genome_dir / Path(f"GCR_{i:09d}.1_genomic.fna")).touch()
@@ -1,34 +1,248 @@
 """Utility function to manipulate assembly summary files."""
 
-import csv
+import pickle
+import re
+from collections.abc import Callable, Iterable, Iterator
 from pathlib import Path
-from data_assembly.config import INPUT_PATH, OUTPUT_PATH
+from typing import Self, TextIO
+from data_assembly.config import IGNORED_SUFFIXES, INPUT_PATH, OUTPUT_PATH
 
+ACCESSION_PATTERN = re.compile(r"[A-Z]{3}_\d+(\.\d+)?")
+# Suffix of the binary cache of an assembly summary.
+BINARY_SUFFIX = ".pkl"
 
-def filter_assembly_summary(assembly_summary: Path, output_path: Path) -> None:
+
+def read_header(f: TextIO) -> list[str]:
+    """Read the header of an assembly summary, skipping its comment lines.
+
+    NCBI assembly summaries start with `##` comments followed by a header
+    starting with `#`, the other tsv files with a plain header.
+    """
+    for line in f:
+        if not line.startswith("##"):
+            return [name.lstrip("# ") for name in line.rstrip("\n").split("\t")]
+    return []
+
+
+def get_column_index(header: list[str], column: int | str) -> int:
+    """Get the position of a column given by position or by name."""
+    return header.index(column) if isinstance(column, str) else column
+
+
+def iter_assembly_summary(
+    tsv_path: Path,
+    columns: list[int | str] | None = None,
+    predicate: Callable[[list[str]], bool] | None = None,
+) -> Iterator[list[str]]:
+    """Iterate lazily over the rows of an assembly summary.
+
+    Rows for which `predicate` is false are skipped, the predicate being given
+    the whole row. Only `columns` are kept from each row when given. The file
+    is read line by line so that memory does not grow with its size.
+    """
+    with tsv_path.open("r") as f:
+        header = read_header(f)
+        indices = [get_column_index(header, column) for column in columns or []]
+        for line in f:
+            row = line.rstrip("\n").split("\t")
+            if predicate is not None and not predicate(row):
+                continue
+            yield [row[i] for i in indices] if indices else row
+
+
+def get_gcf_pairs(
+    rows: Iterable[list[str]], accession_column: int = 1, paired_column: int = 2
+) -> tuple[set[str], set[str]]:
+    """Get the GCF accessions of rows and the GCA accessions paired with them."""
+    gcf_accessions = set()
+    paired_gca = set()
+    for row in rows:
+        if row[accession_column].startswith("GCF"):
+            gcf_accessions.add(row[accession_column])
+            paired_gca.add(row[paired_column])
+    return gcf_accessions, paired_gca
+
+
+def dedup_paired_rows(
+    rows: Iterable[list[str]],
+    gcf_pairs: tuple[set[str], set[str]],
+    accession_column: int = 1,
+    paired_column: int = 2,
+) -> Iterator[list[str]]:
+    """Keep only the GCF row of the genomes listed both as GCA and GCF.
+
+    `gcf_pairs` are the GCF accessions of the rows and the GCA accessions
+    paired with them, see `get_gcf_pairs`, collected in a first pass over the
+    rows. Rows are then deduplicated as they stream, in their order, memory
+    growing with the number of GCF accessions but not with the rows.
+    """
+    gcf_accessions, paired_gca = gcf_pairs
+    for row in rows:
+        accession, paired = row[accession_column], row[paired_column]
+        if accession.startswith("GCF") or (
+            accession not in paired_gca and paired not in gcf_accessions
+        ):
+            yield row
+
+
+def filter_assembly_summary(
+    assembly_summary: Path,
+    output_path: Path,
+    columns: list[int | str] | None = None,
+    predicate: Callable[[list[str]], bool] | None = None,
+    accession_column: int = 1,
+    paired_column: int = 2,
+) -> int:
     """Filter an assembly summary to keep onlly GCF lines.
 
     When downloading assembly summary from NCBI their is multiple line for
     the same genomes. This function rewrite the assembly summary to keep
-    only one line by accession nuber.
+    only one line by accession nuber, see `dedup_paired_rows`, reading the
+    file twice to hold only accessions in memory. Rows can also be filtered
+    by `predicate` and reduced to `columns`, which must keep the accession
+    column. The output is a tsv file, or a binary cache of an
+    `AssemblySummary` when its name ends with `BINARY_SUFFIX`. Return the
+    number of rows written.
     """
-    with assembly_summary.open("r") as f_i, output_path.open("w+") as f_w:
-        csv_reader = csv.reader(f_i, delimiter="\t")
-        next(csv_reader)
-        csv_writter = csv.writer(f_w, delimiter="\t")
-        for line in csv_reader:
-            if line[1][0:3] == "GCA" and line[2] != "":
-                continue
-            else:
-                csv_writter.writerow(line)
+    with assembly_summary.open("r") as f:
+        header = read_header(f)
+    indices = [get_column_index(header, column) for column in columns or []]
+    if indices and accession_column not in indices:
+        raise ValueError(
+            f"The accession column {accession_column} is not in the columns kept."
+        )
+    gcf_pairs = get_gcf_pairs(
+        iter_assembly_summary(assembly_summary, predicate=predicate),
+        accession_column,
+        paired_column,
+    )
+    rows = dedup_paired_rows(
+        iter_assembly_summary(assembly_summary, predicate=predicate),
+        gcf_pairs,
+        accession_column,
+        paired_column,
+    )
+    if indices:
+        header = [header[i] for i in indices]
+        rows = ([row[i] for i in indices] for row in rows)
+        accession_column = indices.index(accession_column)
 
+    if output_path.suffix == BINARY_SUFFIX:
+        summary = AssemblySummary.from_rows(header, rows, accession_column)
+        summary.to_cache(output_path)
+        return len(summary)
+    n_rows = 0
+    with output_path.open("w+") as f_w:
+        f_w.write("\t".join(header) + "\n")
+        for row in rows:
+            f_w.write("\t".join(row) + "\n")
+            n_rows += 1
+    return n_rows
 
-def get_column_from_tsv(tsv_path: Path, column_id: int) -> list[str]:
-    """Get all genome accession from a tsv file."""
-    with tsv_path.open("r") as f:
-        csv_reader = csv.reader(f, delimiter="\t")
-        next(csv_reader)
-        return [line[1] for line in csv_reader]
+
+def iter_column(tsv_path: Path, column_id: int | str) -> Iterator[str]:
+    """Iterate lazily over a column of a tsv file."""
+    for (value,) in iter_assembly_summary(tsv_path, [column_id]):
+        yield value
+
+
+def get_column_from_tsv(tsv_path: Path, column_id: int | str) -> list[str]:
+    """Get all values of a column from a tsv file, like its genome accessions."""
+    return list(iter_column(tsv_path, column_id))
+
+
+class AssemblySummary:
+    """An assembly summary loaded in columns and indexed by accession.
+
+    Columns are read by position or by their name in the header. Rows are
+    found by accession through a dict built once at loading.
+    """
+
+    def __init__(
+        self, header: list[str], columns: list[list[str]], accession_column: int = 1
+    ):
+        self.header: list[str] = header
+        self.columns: list[list[str]] = columns
+        self.accession_column: int = accession_column
+        self.index: dict[str, int] = {}
+        for i, accession in enumerate(columns[accession_column] if columns else []):
+            self.index.setdefault(accession, i)
+
+    @classmethod
+    def from_rows(
+        cls, header: list[str], rows: Iterable[list[str]], accession_column: int = 1
+    ) -> Self:
+        """Build an assembly summary from its header and rows."""
+        columns = [[] for _ in header]
+        for row in rows:
+            if len(row) > len(columns):
+                n_rows = len(columns[0]) if columns else 0
+                columns += [[""] * n_rows for _ in range(len(row) - len(columns))]
+            row = row + [""] * (len(columns) - len(row))
+            for column, value in zip(columns, row):
+                column.append(value)
+        header = header + [""] * (len(columns) - len(header))
+        return cls(header, columns, accession_column)
+
+    @classmethod
+    def from_tsv(cls, tsv_path: Path, accession_column: int = 1) -> Self:
+        """Load an assembly summary from a tsv file, or from its binary cache."""
+        if tsv_path.suffix == BINARY_SUFFIX:
+            return cls.from_cache(tsv_path)
+        with tsv_path.open("r") as f:
+            header = read_header(f)
+        return cls.from_rows(header, iter_assembly_summary(tsv_path), accession_column)
+
+    @classmethod
+    def from_cache(cls, cache_path: Path) -> Self:
+        """Load an assembly summary written by `to_cache`."""
+        with cache_path.open("rb") as f:
+            header, columns, accession_column = pickle.load(f)
+        return cls(header, columns, accession_column)
+
+    def to_cache(self, cache_path: Path):
+        """Write the assembly summary in a binary file, fast to load again."""
+        with cache_path.open("wb") as f:
+            pickle.dump(
+                (self.header, self.columns, self.accession_column),
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def __contains__(self, accession: str) -> bool:
+        return accession in self.index
+
+    def column(self, column: int | str) -> list[str]:
+        """Get a column by position or by name."""
+        if isinstance(column, str):
+            column = self.header.index(column)
+        return self.columns[column]
+
+    def row(self, accession: str) -> list[str]:
+        """Get the row of an accession."""
+        i = self.index[accession]
+        return [column[i] for column in self.columns]
+
+
+def get_genome_accession(genome_path: Path) -> str:
+    """Get the accession a genome file is named after, like `GCR_000001.1`."""
+    match = ACCESSION_PATTERN.match(genome_path.name)
+    if match:
+        return match.group()
+    return "_".join(genome_path.stem.split("_")[:2])
+
+
+def scan_genome_dir(genome_dir: Path) -> dict[str, Path]:
+    """Map the accession of each genome file of a directory to its path."""
+    genome_files = {}
+    for path in sorted(genome_dir.iterdir()):
+        if path.name.startswith(".") or path.suffix in IGNORED_SUFFIXES:
+            continue
+        genome_files.setdefault(get_genome_accession(path), path)
+    return genome_files
 
 
 if __name__ == "__main__":
@@ -40,3 +254,4 @@ if __name__ == "__main__":
     #     Path(__file__).parents[2] / Path("input_data/alteromonadales.tsv"),
     #     Path(__file__).parents[2] / Path("input_data/alteromonadales_filtered.tsv"),
     # )
+    pass
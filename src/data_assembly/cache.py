@@ -0,0 +1,87 @@
+"""Content addressed cache of the outputs of the pipeline.
+
+A job is identified by a key hashing everything its outputs depend on: the
+content of its input files and its parameters. Once a job is done its outputs
+are recorded under its key, so a rerun skips the jobs whose inputs did not
+change and a batch stopped midway resumes where it was.
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Iterator
+
+
+def hash_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Get the SHA-256 of the content of a file."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(*parts: str) -> str:
+    """Get the key of a job from the hashes and parameters it depends on."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class Cache:
+    """Outputs of completed jobs, by key.
+
+    Each job is recorded in its own small JSON file of `root`, written in a
+    temporary file then renamed. Worker processes can thus record their jobs
+    at the same time without a lock, and an interrupted batch never leaves a
+    half written record.
+    """
+
+    def __init__(self, root: Path):
+        self.root: Path = root
+
+    def _record_path(self, key: str) -> Path:
+        return self.root / Path(f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        """Get the record of a job, if it is done and its outputs still exist."""
+        try:
+            with self._record_path(key).open("r") as f:
+                record = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not all(Path(output).exists() for output in record["outputs"]):
+            return None
+        return record
+
+    def records(self) -> Iterator[dict]:
+        """Iterate over the records of the cache, in no particular order."""
+        if not self.root.is_dir():
+            return
+        for record_path in self.root.glob("*.json"):
+            if record_path.name.startswith("."):
+                continue
+            try:
+                with record_path.open("r") as f:
+                    yield json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+
+    def record(self, key: str, outputs: list[Path], **metadata):
+        """Record a completed job and its outputs."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        record = {
+            "key": key,
+            "outputs": [str(output) for output in outputs],
+            "time": time.time(),
+            **metadata,
+        }
+        tmp_path = self.root / Path(f".{key}.{uuid.uuid4().hex}.json")
+        with tmp_path.open("w+") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self._record_path(key))
@@ -0,0 +1,474 @@
+"""Command line interface of the package."""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING
+from data_assembly.cache import Cache, cache_key, hash_file
+from data_assembly.config import (
+    CACHE_DIR,
+    IGNORED_SUFFIXES,
+    MIN_SEQUENCE_LEN,
+    N_RUN_LIMIT,
+    PGAP_EXECUTABLE,
+    PGAP_MAX_GENOME_LEN,
+    PGAP_MIN_GENOME_LEN,
+)
+from data_assembly.dedup import group_identical_files, link_file
+from data_assembly.fasta import (
+    CleaningReport,
+    get_parsed_genome_name,
+    parse_genome,
+    write_cleaning_reports,
+)
+from data_assembly.profiling import (
+    TimingEvent,
+    add_events,
+    drain_events,
+    enable_timings,
+    export_timings,
+    profiling,
+    timed,
+)
+
+# The modules of the other commands are imported by the commands, so that the
+# workers cleaning genomes, which import this module, start fast.
+if TYPE_CHECKING:
+    from data_assembly.scheduler import JobResult
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def configure_logging(verbosity: int = 0, log_file: Path | None = None):
+    """Log warnings, or infos and debug messages with a higher `verbosity`.
+
+    Logs are written in `log_file` when given, on stderr otherwise.
+    """
+    level = (logging.WARNING, logging.INFO, logging.DEBUG)[min(verbosity, 2)]
+    if log_file is not None:
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        filename=log_file, encoding="utf-8", level=level, format=LOG_FORMAT
+    )
+
+
+def list_genomes(in_dir: Path) -> list[Path]:
+    """List the genome files of a directory, largest first."""
+    genome_paths = [
+        path
+        for path in in_dir.iterdir()
+        if path.is_file()
+        and not path.name.startswith(".")
+        and path.suffix not in IGNORED_SUFFIXES
+    ]
+    return sorted(genome_paths, key=lambda path: path.stat().st_size, reverse=True)
+
+
+def clean_genome(
+    args: tuple[Path, Path, bool, int | None, int | None, bool],
+) -> tuple[Path | None, bool, CleaningReport, list[TimingEvent]]:
+    """Clean a genome unless it was already cleaned with the same parameters.
+
+    The genome is streamed by chunks of the given size, if any, and written
+    with the given compression level and BGZF flag, see `parse_genome`.
+    Return the path of the written file, if any, if it comes from the cache,
+    the report of the cleaning and the timings recorded by the worker.
+    """
+    (genome_path, out_dir, force, chunk_size, compresslevel, bgzf) = args
+    with (
+        profiling(f"clean.{genome_path.stem}"),
+        timed("clean", genome=genome_path.stem),
+    ):
+        output_path, cached, report = _clean_genome(
+            genome_path, out_dir, force, chunk_size, compresslevel, bgzf
+        )
+    return output_path, cached, report, drain_events()
+
+
+def _clean_genome(
+    genome_path: Path,
+    out_dir: Path,
+    force: bool,
+    chunk_size: int | None,
+    compresslevel: int | None = None,
+    bgzf: bool = False,
+) -> tuple[Path | None, bool, CleaningReport]:
+    """Clean a genome or get it from the cache, see `clean_genome`."""
+    cache = Cache(out_dir / CACHE_DIR)
+    key = cache_key(
+        "clean",
+        genome_path.name,
+        hash_file(genome_path),
+        f"limit={N_RUN_LIMIT}",
+        f"threshold={MIN_SEQUENCE_LEN}",
+        f"pgap_range={PGAP_MIN_GENOME_LEN},{PGAP_MAX_GENOME_LEN}",
+        f"compresslevel={compresslevel}",
+        f"bgzf={bgzf}",
+    )
+    record = None if force else cache.get(key)
+    if record is not None:
+        outputs = record["outputs"]
+        report = CleaningReport.from_dict(
+            record.get("report", {"genome": genome_path.stem})
+        )
+        return (Path(outputs[0]) if outputs else None), True, report
+    report = CleaningReport(genome_path.stem)
+    output_path = parse_genome(
+        (genome_path, out_dir), report, chunk_size, compresslevel, bgzf
+    )
+    cache.record(
+        key,
+        [output_path] if output_path else [],
+        genome=str(genome_path),
+        report=report.to_dict(),
+    )
+    return output_path, False, report
+
+
+def clean(
+    in_dir: Path,
+    out_dir: Path,
+    jobs: int,
+    force: bool = False,
+    report_path: Path | None = None,
+    timings_path: Path | None = None,
+    chunk_size: int | None = None,
+    compresslevel: int | None = None,
+    bgzf: bool = False,
+) -> int:
+    """Clean every genome of `in_dir` for PGAP and write them in `out_dir`.
+
+    Genomes are spread over `jobs` processes, the largest ones first so that a
+    big genome does not start last and hold the whole batch. Results are
+    printed as soon as each genome is done. Genomes cleaned by a previous run
+    are skipped unless `force` is set. The cleaning report of each genome is
+    written in `report_path` when given, see `write_cleaning_reports`, and the
+    timings of the run in `timings_path`, see `export_timings`. Genomes are
+    streamed by chunks of `chunk_size` bytes when given, which bounds the
+    memory of each process whatever the length of the contigs. Cleaned genomes
+    are gzip compressed at `compresslevel` when given, and as BGZF when `bgzf`
+    is set, see `parse_genome`. Genome files
+    identical byte for byte are cleaned once, the cleaned genome being linked
+    to the names of the others. Return the number of failures.
+    """
+    if timings_path is not None:
+        enable_timings()
+    genome_paths = list_genomes(in_dir)
+    duplicates = group_identical_files(genome_paths)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    n_written = n_skipped = n_cached = n_failed = n_duplicates = 0
+    input_size = 0
+    reports = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(
+                clean_genome,
+                (genome_path, out_dir, force, chunk_size, compresslevel, bgzf),
+            ): genome_path
+            for genome_path in duplicates
+        }
+        for future in as_completed(futures):
+            genome_path = futures[future]
+            input_size += genome_path.stat().st_size
+            try:
+                output_path, cached, report, events = future.result()
+            except Exception as error:
+                n_failed += 1 + len(duplicates[genome_path])
+                for path in [genome_path, *duplicates[genome_path]]:
+                    print(f"{path.name}\tfailed\t{error!r}", flush=True)
+                continue
+            reports.append(report)
+            if timings_path is not None:
+                add_events(events)
+            n_cached += cached
+            origin = "\tcached" if cached else ""
+            if output_path is None:
+                n_skipped += 1
+                print(f"{genome_path.name}\tout of PGAP range{origin}", flush=True)
+            else:
+                n_written += 1
+                print(f"{genome_path.name}\t{output_path.name}{origin}", flush=True)
+            for duplicate_path in duplicates[genome_path]:
+                n_duplicates += 1
+                reports.append(report.as_duplicate(duplicate_path.stem))
+                origin = f"\tduplicate of {genome_path.name}"
+                if output_path is None:
+                    print(
+                        f"{duplicate_path.name}\tout of PGAP range{origin}", flush=True
+                    )
+                    continue
+                duplicate_output = out_dir / Path(
+                    get_parsed_genome_name(
+                        duplicate_path.name, compresslevel is not None or bgzf
+                    )
+                )
+                link_file(output_path, duplicate_output)
+                print(
+                    f"{duplicate_path.name}\t{duplicate_output.name}{origin}",
+                    flush=True,
+                )
+    elapsed = time.perf_counter() - start
+    print(
+        f"{len(genome_paths)} genomes in {elapsed:.1f} s "
+        f"({n_written} written, {n_skipped} out of PGAP range, {n_failed} failed, "
+        f"{n_cached} from cache, {n_duplicates} duplicates): "
+        f"{len(genome_paths) / elapsed:.2f} genomes/s, "
+        f"{input_size / 1e6 / elapsed:.2f} MB/s of input",
+        file=sys.stderr,
+    )
+    if report_path is not None:
+        write_cleaning_reports(reports, report_path)
+    if timings_path is not None:
+        export_timings(drain_events(), timings_path)
+    return n_failed
+
+
+def qc(in_dir: Path, jobs: int, output_path: Path | None = None):
+    """Measure every genome of `in_dir` and write a table of their metrics.
+
+    The table is printed when no `output_path` is given.
+    """
+    from data_assembly.qc import genomes_qc, write_qc_table
+
+    results = genomes_qc(list_genomes(in_dir), jobs)
+    if output_path is None:
+        write_qc_table(results, sys.stdout)
+    else:
+        with output_path.open("w+") as f:
+            write_qc_table(results, f)
+
+
+def print_pgap_result(result: "JobResult", n_done: int, n_jobs: int):
+    """Print the result of a PGAP run and the progress of the batch."""
+    if result.returncode is None:
+        status = "cached"
+    elif result.returncode:
+        status = f"failed ({result.returncode})"
+    else:
+        status = "success"
+    origin = ""
+    if result.duplicate_of is not None:
+        origin = f"\tduplicate of {result.duplicate_of.name}"
+    print(
+        f"{result.job.genome_path.name}\t{status}\t{result.wall_time:.1f} s\t"
+        f"{result.cost.cpus} CPUs\t{result.cost.memory_gb} GB\t"
+        f"{result.attempts} attempts{origin}",
+        flush=True,
+    )
+    print(f"{n_done}/{n_jobs} genomes done", file=sys.stderr, flush=True)
+
+
+def annotate(
+    genomes_dir: Path,
+    tsv_path: Path,
+    out_dir: Path,
+    cpus: int | None = None,
+    memory_gb: int | None = None,
+    pgap_executable: Path = PGAP_EXECUTABLE,
+    timings_path: Path | None = None,
+    timeout: float | None = None,
+    retries: int = 0,
+) -> int:
+    """Annotate with PGAP the cleaned genomes listed in an assembly summary.
+
+    Each genome is annotated in a directory of `out_dir` named after it, the
+    output of PGAP being written next to it in a `.log` file. Runs longer than
+    `timeout` seconds are killed and failed runs are tried again `retries`
+    times. Identical genomes of the same organism are annotated once, see
+    `PgapScheduler`. Results are printed as soon as each run ends. The timings
+    of the run are written in `timings_path` when given. Return the number of
+    failures.
+    """
+    from data_assembly.pgap import get_pgap_inputs
+    from data_assembly.scheduler import AsyncPgapScheduler, PgapJob
+
+    if timings_path is not None:
+        enable_timings()
+    jobs = [
+        PgapJob(genome_path, strain, org_name, out_dir / Path(genome_path.stem))
+        for (genome_path, strain, org_name) in get_pgap_inputs(genomes_dir, tsv_path)
+    ]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    scheduler = AsyncPgapScheduler(
+        cpus,
+        memory_gb,
+        pgap_executable,
+        timeout=timeout,
+        retries=retries,
+        on_result=print_pgap_result,
+    )
+    start = time.perf_counter()
+    with profiling("pgap"):
+        results = scheduler.run(jobs)
+    elapsed = time.perf_counter() - start
+    n_failed = sum(bool(result.returncode) for result in results)
+    print(
+        f"{len(results)} genomes annotated in {elapsed:.1f} s, {n_failed} failed.",
+        file=sys.stderr,
+    )
+    if timings_path is not None:
+        export_timings(drain_events(), timings_path)
+    return n_failed
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the command line interface."""
+    parser = argparse.ArgumentParser(prog="data-assembly")
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Log infos, and debug messages when repeated.",
+    )
+    parser.add_argument(
+        "--log-file", type=Path, help="File to write the logs in, stderr by default."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    clean_parser = subparsers.add_parser(
+        "clean", help="Clean genomes to be annotated by PGAP."
+    )
+    clean_parser.add_argument("in_dir", type=Path, help="Directory of genomes.")
+    clean_parser.add_argument(
+        "out_dir", type=Path, help="Directory to write the cleaned genomes in."
+    )
+    clean_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of genomes cleaned in parallel.",
+    )
+    clean_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Clean again the genomes cleaned by a previous run.",
+    )
+    clean_parser.add_argument(
+        "--report",
+        type=Path,
+        help="File to write the cleaning report of each genome in, "
+        "as JSON lines if it ends with .json or .jsonl, as tsv otherwise.",
+    )
+    clean_parser.add_argument(
+        "--timings",
+        type=Path,
+        help="JSON file to write the timings of each stage in, "
+        "also readable as a Chrome trace.",
+    )
+    clean_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help="Stream genomes by chunks of this many MiB instead of loading "
+        "whole contigs, to bound the memory of each process.",
+    )
+    clean_parser.add_argument(
+        "--compress-level",
+        type=int,
+        choices=range(10),
+        metavar="{0-9}",
+        help="Gzip compress the cleaned genomes at this level, 1 being the "
+        "fastest and 9 the smallest.",
+    )
+    clean_parser.add_argument(
+        "--bgzf",
+        action="store_true",
+        help="Compress the cleaned genomes as BGZF, which samtools can index.",
+    )
+
+    qc_parser = subparsers.add_parser(
+        "qc", help="Measure genomes: length, N50, GC content and gaps."
+    )
+    qc_parser.add_argument("in_dir", type=Path, help="Directory of genomes.")
+    qc_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of genomes measured in parallel.",
+    )
+    qc_parser.add_argument(
+        "-o", "--output", type=Path, help="File to write the table in."
+    )
+
+    pgap_parser = subparsers.add_parser(
+        "pgap", help="Annotate cleaned genomes with PGAP."
+    )
+    pgap_parser.add_argument(
+        "genomes_dir", type=Path, help="Directory of cleaned genomes."
+    )
+    pgap_parser.add_argument(
+        "tsv_path", type=Path, help="Assembly summary of the genomes to annotate."
+    )
+    pgap_parser.add_argument(
+        "out_dir", type=Path, help="Directory to write the annotations in."
+    )
+    pgap_parser.add_argument(
+        "--cpus", type=int, help="CPUs shared by PGAP runs, all by default."
+    )
+    pgap_parser.add_argument(
+        "--memory",
+        type=int,
+        help="Memory in GB shared by PGAP runs, all by default.",
+    )
+    pgap_parser.add_argument(
+        "--pgap", type=Path, default=PGAP_EXECUTABLE, help="The pgap.py script."
+    )
+    pgap_parser.add_argument(
+        "--timings",
+        type=Path,
+        help="JSON file to write the timings of each run in, "
+        "also readable as a Chrome trace.",
+    )
+    pgap_parser.add_argument(
+        "--timeout", type=float, help="Seconds after which a PGAP run is killed."
+    )
+    pgap_parser.add_argument(
+        "--retries",
+        type=int,
+        default=0,
+        help="Number of times a failed PGAP run is tried again.",
+    )
+
+    args = parser.parse_args(argv)
+    configure_logging(args.verbose, args.log_file)
+    if args.command == "clean":
+        n_failed = clean(
+            args.in_dir,
+            args.out_dir,
+            args.jobs,
+            args.force,
+            args.report,
+            args.timings,
+            args.chunk_size << 20 if args.chunk_size else None,
+            args.compress_level,
+            args.bgzf,
+        )
+        return 1 if n_failed else 0
+    if args.command == "qc":
+        qc(args.in_dir, args.jobs, args.output)
+        return 0
+    if args.command == "pgap":
+        n_failed = annotate(
+            args.genomes_dir,
+            args.tsv_path,
+            args.out_dir,
+            args.cpus,
+            args.memory,
+            args.pgap,
+            args.timings,
+            args.timeout,
+            args.retries,
+        )
+        return 1 if n_failed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
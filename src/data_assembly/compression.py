@@ -0,0 +1,99 @@
+"""Transparent reading and writing of gzip and BGZF compressed files."""
+
+import gzip
+import io
+import struct
+import zlib
+from pathlib import Path
+from typing import BinaryIO
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Largest amount of data put in a BGZF block, as htslib does, so that the
+# compressed block always fits in the 64 KiB a block may hold.
+BGZF_BLOCK_SIZE = 0xFF00
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+_BGZF_HEADER = struct.Struct("<4BI2BH2BHH")
+_BGZF_FOOTER = struct.Struct("<II")
+
+
+def is_gzip(path: Path) -> bool:
+    """Get if a file is gzip compressed, BGZF included, from its magic bytes."""
+    with path.open("rb") as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def open_input(path: Path) -> BinaryIO:
+    """Open a file for reading, decompressing it on the fly if needed."""
+    if is_gzip(path):
+        return gzip.open(path, "rb")
+    return path.open("rb")
+
+
+def open_output(
+    path: Path, compresslevel: int | None = None, bgzf: bool = False
+) -> BinaryIO:
+    """Open a file for writing.
+
+    The file is compressed when `bgzf` is set, when `compresslevel` is given
+    or when its name ends with `.gz`. BGZF files are gzip files readable by
+    any gzip reader which can also be indexed by samtools.
+    """
+    if compresslevel is None and not bgzf and path.suffix != ".gz":
+        return path.open("wb")
+    if compresslevel is None:
+        compresslevel = 6
+    if bgzf:
+        return BgzfWriter(path.open("wb"), compresslevel)
+    return gzip.open(path, "wb", compresslevel=compresslevel)
+
+
+class BgzfWriter(io.BufferedIOBase):
+    """Write a BGZF file, a series of gzip members of at most 64 KiB."""
+
+    def __init__(self, raw: BinaryIO, compresslevel: int = 6):
+        self.raw: BinaryIO = raw
+        self.compresslevel: int = compresslevel
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._buffer += data
+        while len(self._buffer) >= BGZF_BLOCK_SIZE:
+            self._write_block(self._buffer[:BGZF_BLOCK_SIZE])
+            del self._buffer[:BGZF_BLOCK_SIZE]
+        return len(data)
+
+    def _write_block(self, data: bytes | bytearray):
+        """Compress `data` in a single BGZF block."""
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+        cdata = compressor.compress(data) + compressor.flush()
+        block_size = _BGZF_HEADER.size + len(cdata) + _BGZF_FOOTER.size
+        self.raw.write(
+            _BGZF_HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, block_size - 1)
+        )
+        self.raw.write(cdata)
+        self.raw.write(_BGZF_FOOTER.pack(zlib.crc32(data), len(data)))
+
+    def flush(self):
+        """Write the buffered data in a block and flush the file."""
+        if self._buffer:
+            self._write_block(self._buffer)
+            self._buffer.clear()
+        self.raw.flush()
+
+    def close(self):
+        """Write the last block and the end of file marker, then close."""
+        if self.closed:
+            return
+        try:
+            self.flush()
+            self.raw.write(BGZF_EOF)
+        finally:
+            try:
+                super().close()
+            finally:
+                self.raw.close()
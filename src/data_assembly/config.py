@@ -1,5 +1,25 @@
 """Config file for the package."""
+
 from pathlib import Path
 
 INPUT_PATH = Path(__file__).parents[1] / Path("input_data")
-OUTPUT_PATH = Path(__file__).parents[1] / Path("output_data")
\ No newline at end of file
+OUTPUT_PATH = Path(__file__).parents[1] / Path("output_data")
+
+# Genome length limits accepted by PGAP.
+PGAP_MIN_GENOME_LEN = 10e3
+PGAP_MAX_GENOME_LEN = 100e6
+
+# Cleaning of genomes before PGAP: longest run of N kept and shortest sequence kept.
+N_RUN_LIMIT = 9
+MIN_SEQUENCE_LEN = 2000
+# Size of the chunks a genome is read and cleaned by when streamed.
+CHUNK_SIZE = 1 << 20
+
+# Directory of the cache of completed jobs, in the output directory of a batch.
+CACHE_DIR = Path(".cache")
+
+# PGAP command, see https://github.com/ncbi/pgap.
+PGAP_EXECUTABLE = Path("/home/pgap/pgap.py")
+
+# Files found next to genomes which are not genomes themselves.
+IGNORED_SUFFIXES = (".fai", ".gzi")
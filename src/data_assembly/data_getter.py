@@ -1,60 +1,246 @@
 """Utilities function to get data from ifferent online database."""
 
+import os
 import subprocess
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from pathlib import Path
 import shutil
 import logging
-from assembly_summary import get_genome_accession_from_tsv
+from data_assembly.assembly_summary import get_column_from_tsv
+from data_assembly.config import PGAP_MIN_GENOME_LEN
+from data_assembly.fasta import (
+    CleaningReport,
+    clean_genome,
+    get_parsed_genome_name,
+    iter_fasta_records,
+    write_cleaning_reports,
+)
+from data_assembly.profiling import timed
 
 INPUT_PATH = Path(__file__).parents[2] / Path("input_data")
 OUTPUT_PATH = Path(__file__).parents[2] / Path("output_data")
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    filename=(Path(__file__).parents[2] / Path("log/data_getter.log")),
-    encoding="utf-8",
-    level=logging.DEBUG,
-)
 
+# Files of each genome to download.
+DATASETS_INCLUDE = "genome,protein,seq-report"
+# Directory of the genomes in a datasets archive, one directory by accession.
+DATASETS_DATA_DIR = ["ncbi_dataset", "data"]
+# End of the name of the genome sequence file of a datasets archive.
+GENOME_SUFFIX = "_genomic.fna"
+COPY_BUFFER_SIZE = 1 << 20
 
-def get_datasets(gcf_number: str):
-    """Downloads dataset from NCBI."""
-    gcf_number = gcf_number.replace(" ", "_")
-    cmd = f"datasets download genome accession {gcf_number} --include genome,protein,seq-report"
-    process = subprocess.Popen(cmd.split(" "), cwd="/tmp", text=False)
-    process.wait()
-    if process.returncode:
+
+class DatasetsBackend:
+    """Fetch genomes from NCBI with the `datasets` command line tool."""
+
+    def __init__(self, binary: str = "datasets", include: str = DATASETS_INCLUDE):
+        self.binary: str = binary
+        self.include: str = include
+
+    def fetch(self, accessions: list[str], zip_path: Path) -> bool:
+        """Download the genomes of `accessions` in a single archive."""
+        cmd = [
+            self.binary,
+            "download",
+            "genome",
+            "accession",
+            *accessions,
+            "--include",
+            self.include,
+            "--filename",
+            str(zip_path),
+        ]
+        process = subprocess.Popen(cmd, cwd=zip_path.parent, text=False)
+        return process.wait() == 0
+
+
+class LocalDirectoryBackend:
+    """Fetch genomes from a local directory laid out as NCBI datasets archives.
+
+    Each genome is a `root/<accession>` directory, packed in an archive as
+    `datasets` would have downloaded it.
+    """
+
+    def __init__(self, root: Path):
+        self.root: Path = root
+
+    def fetch(self, accessions: list[str], zip_path: Path) -> bool:
+        """Pack the genomes of `accessions` in a single archive."""
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            for accession in accessions:
+                for path in (self.root / Path(accession)).glob("*"):
+                    archive.write(path, f"ncbi_dataset/data/{accession}/{path.name}")
+        return True
+
+
+def extract_datasets(
+    zip_path: Path,
+    accessions: list[str],
+    output_dir: Path,
+    parsed_dir: Path | None = None,
+    reports: list[CleaningReport] | None = None,
+) -> dict[str, bool]:
+    """Extract the genomes of a datasets archive in `output_dir/<accession>`.
+
+    The files of each genome are streamed from the archive to their final
+    location, nothing else of the archive is extracted. When `parsed_dir` is
+    given, the genome sequence is not written as is but cleaned for PGAP
+    straight from the archive and written in `parsed_dir`, as `parse_genome`
+    does, with its cleaning report added to `reports` when given. A genome out
+    of the PGAP limits is then not extracted.
+    """
+    members = {}
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            parts = info.filename.split("/")
+            if len(parts) == 4 and parts[:2] == DATASETS_DATA_DIR and parts[3]:
+                members.setdefault(parts[2], []).append(info)
+
+        extracted = {}
+        for accession in accessions:
+            extracted[accession] = accession in members
+            if not extracted[accession]:
+                logger.warning(f"Warning the genome {accession} is not in {zip_path}.")
+                continue
+            accession_dir = output_dir / Path(accession)
+            accession_dir.mkdir(parents=True, exist_ok=True)
+            for info in members[accession]:
+                name = info.filename.split("/")[3]
+                if (
+                    parsed_dir is not None
+                    and name.startswith(accession)
+                    and name.endswith(GENOME_SUFFIX)
+                ):
+                    report = CleaningReport(Path(name).stem)
+                    if reports is not None:
+                        reports.append(report)
+                    if info.file_size <= PGAP_MIN_GENOME_LEN:
+                        report.status = "too short"
+                        output_path = None
+                    else:
+                        output_path = clean_genome(
+                            iter_fasta_records(archive.open(info)),
+                            parsed_dir / Path(get_parsed_genome_name(name)),
+                            report.genome,
+                            report,
+                        )
+                    if output_path is None:
+                        extracted[accession] = False
+                        logger.warning(
+                            f"Warning the genome {accession} is {report.status} "
+                            "for PGAP, it is not kept."
+                        )
+                    continue
+                tmp_path = accession_dir / Path(f".{name}.{uuid.uuid4().hex}")
+                with archive.open(info) as f_i, tmp_path.open("wb") as f_o:
+                    shutil.copyfileobj(f_i, f_o, COPY_BUFFER_SIZE)
+                os.replace(tmp_path, accession_dir / Path(name))
+            logger.debug(f"Unzip of the genome {accession} finished correctly.")
+    return extracted
+
+
+@timed("download_genomes")
+def download_genomes(
+    accessions: list[str],
+    output_dir: Path,
+    backend=None,
+    batch_size: int = 10,
+    max_downloads: int = 4,
+    scratch_dir: Path | None = None,
+    parsed_dir: Path | None = None,
+    report_path: Path | None = None,
+) -> dict[str, bool]:
+    """Download genomes in `output_dir/<accession>`.
+
+    Accessions are fetched by batches of `batch_size`, with at most
+    `max_downloads` batches downloading at the same time. Each batch has its
+    own scratch directory and is extracted in a separate thread as soon as it
+    is downloaded, while the next batches keep downloading. With `parsed_dir`
+    genomes are cleaned for PGAP while extracted, see `extract_datasets`, and
+    their cleaning reports written in `report_path` when given, see
+    `write_cleaning_reports`. Return whether each genome was downloaded.
+    """
+    if backend is None:
+        backend = DatasetsBackend()
+    accessions = [accession.replace(" ", "_") for accession in accessions]
+    batches = [
+        accessions[i : i + batch_size] for i in range(0, len(accessions), batch_size)
+    ]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if parsed_dir is not None:
+        parsed_dir.mkdir(parents=True, exist_ok=True)
+    downloaded = dict.fromkeys(accessions, False)
+    reports = []
+
+    def download(batch: list[str]) -> tuple[list[str], Path | None]:
+        batch_dir = Path(tempfile.mkdtemp(prefix="ncbi_dataset_", dir=scratch_dir))
+        zip_path = batch_dir / Path("ncbi_dataset.zip")
+        try:
+            with timed("download", accessions=batch):
+                fetched = backend.fetch(batch, zip_path)
+        except Exception:
+            logger.exception(f"Could not download the genomes {batch}.")
+            fetched = False
+        if fetched:
+            logger.debug(f"Download of the genomes {batch} finished correctly.")
+            return batch, zip_path
         logger.warning(
-            f"Warning the download of the genome {gcf_number} did not succeed correctly."
-        )
-    else:
-        logger.debug(f"Download of the genome {gcf_number} finished correctly.")
-        process = subprocess.Popen(
-            ["unzip", "/tmp/ncbi_dataset.zip", "-d", "/tmp/ncbi_dataset"]
-        )
-        process.wait()
-        shutil.copytree(
-            f"/tmp/ncbi_dataset/ncbi_dataset/data/{gcf_number}",
-            OUTPUT_PATH / Path(f"thermococcales/{gcf_number}"),
+            f"Warning the download of the genomes {batch} did not succeed correctly."
         )
-        shutil.rmtree("/tmp/ncbi_dataset")
-        Path("/tmp/ncbi_dataset.zip").unlink()
+        shutil.rmtree(batch_dir)
+        return batch, None
+
+    def extract(batch: list[str], zip_path: Path):
+        try:
+            with timed("extract", accessions=batch):
+                downloaded.update(
+                    extract_datasets(zip_path, batch, output_dir, parsed_dir, reports)
+                )
+        except Exception:
+            logger.exception(f"Could not extract the genomes {batch}.")
+        finally:
+            shutil.rmtree(zip_path.parent)
+
+    def on_downloaded(future: Future):
+        batch, zip_path = future.result()
+        if zip_path is not None:
+            extractions.append(extractor.submit(extract, batch, zip_path))
+
+    extractions = []
+    with (
+        ThreadPoolExecutor(max_downloads) as downloader,
+        ThreadPoolExecutor(1) as extractor,
+    ):
+        for batch in batches:
+            downloader.submit(download, batch).add_done_callback(on_downloaded)
+        downloader.shutdown(wait=True)
+        wait(extractions)
+    if report_path is not None:
+        write_cleaning_reports(reports, report_path)
+    return downloaded
+
+
+def get_datasets(gcf_number: str, output_dir: Path = OUTPUT_PATH / "thermococcales"):
+    """Downloads dataset from NCBI."""
+    download_genomes([gcf_number], output_dir)
 
-        if process.returncode:
-            logger.warning(
-                f"Warning the unzip of the genome {gcf_number} did not succeed correctly."
-            )
-        else:
-            logger.debug(f"Unzip of the genome {gcf_number} finished correctly.")
 
+def get_genomes_prot(
+    tsv_file: Path, output_dir: Path = OUTPUT_PATH / "thermococcales", **kwargs
+) -> dict[str, bool]:
+    """Download all genomes and its anotation if available in the tsv file.
 
-def get_genomes_prot(tsv_file: Path):
-    """Download all genomes and its anotation if available in the tsv file."""
-    gcfs = get_genome_accession_from_tsv(tsv_file)
-    for gcf in gcfs:
-        get_datasets(gcf)
+    Keyword arguments are given to `download_genomes`.
+    """
+    gcfs = get_column_from_tsv(tsv_file, 1)
+    return download_genomes(gcfs, output_dir, **kwargs)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     # get_genomes_prot(INPUT_PATH / Path("alteromonadales.tsv"))
     get_genomes_prot(INPUT_PATH / Path("thermococcales.tsv"))
@@ -0,0 +1,110 @@
+"""Find identical genomes to clean and annotate each of them only once.
+
+Assembly summaries list the same assembly under a GCA and a GCF accession,
+and resubmissions often carry the same sequences. Genome files identical byte
+for byte are found by their hash before cleaning. Cleaned genomes are compared
+through the fingerprint of their sequences, which ignores titles, line width
+and the order of contigs. The results of the genome processed are then linked
+to the paths of its duplicates.
+"""
+
+import collections
+import hashlib
+import os
+import shutil
+from collections.abc import Callable, Hashable, Iterable
+from pathlib import Path
+from data_assembly.cache import hash_file
+
+
+class GenomeFingerprint:
+    """Hashes of the sequences of the contigs of a genome, computed as read.
+
+    The sequence of a contig is given chunk by chunk between `start_contig`
+    and `end_contig`, so that it is never held in memory for hashing. The
+    fingerprint of the genome hashes the sorted hashes of its contigs.
+    """
+
+    def __init__(self):
+        self.contigs: list[str] = []
+        self._digest = None
+
+    def start_contig(self):
+        """Start hashing the sequence of a new contig."""
+        self._digest = hashlib.sha256()
+
+    def update(self, seq: bytes):
+        """Hash the next chunk of the sequence of the contig."""
+        self._digest.update(seq)
+
+    def end_contig(self, keep: bool = True):
+        """End the contig, dropped from the genome unless `keep` is set."""
+        if keep:
+            self.contigs.append(self._digest.hexdigest())
+        self._digest = None
+
+    def add_contig(self, seq: bytes):
+        """Hash the whole sequence of a contig."""
+        self.start_contig()
+        self.update(seq)
+        self.end_contig()
+
+    @property
+    def genome(self) -> str:
+        """Get the fingerprint of the genome."""
+        digest = hashlib.sha256()
+        for contig in sorted(self.contigs):
+            digest.update(bytes.fromhex(contig))
+        return digest.hexdigest()
+
+
+def group_identical(items: Iterable, get_key: Callable[..., Hashable]) -> dict:
+    """Group items by key.
+
+    Return the first item of each group, in the order of `items`, with the
+    other items of its group.
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(get_key(item), []).append(item)
+    return {first: others for first, *others in groups.values()}
+
+
+def group_identical_files(paths: list[Path]) -> dict[Path, list[Path]]:
+    """Group files with the same content, see `group_identical`.
+
+    Only files sharing their size with another one are hashed.
+    """
+    sizes = {path: path.stat().st_size for path in paths}
+    n_files = collections.Counter(sizes.values())
+    return group_identical(
+        paths,
+        lambda path: (
+            sizes[path],
+            hash_file(path) if n_files[sizes[path]] > 1 else "",
+        ),
+    )
+
+
+def link_file(source: Path, target: Path):
+    """Make `target` a hard link to `source`, or a copy of it if it cannot be."""
+    if target == source:
+        return
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def link_dir(source: Path, target: Path) -> bool:
+    """Make `target` a relative symbolic link to the directory `source`.
+
+    A directory already at `target` is left as it is and False returned.
+    """
+    if target.is_symlink():
+        target.unlink()
+    elif target.exists():
+        return False
+    target.symlink_to(os.path.relpath(source, target.parent), target_is_directory=True)
+    return True
@@ -1,15 +1,26 @@
 """Module to manipulate fasta files."""
 
+import functools
+import io
 import logging
+import os
+import re
 from pathlib import Path
-from typing import Self
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, Self
+from data_assembly.config import (
+    CHUNK_SIZE,
+    MIN_SEQUENCE_LEN,
+    N_RUN_LIMIT,
+    PGAP_MAX_GENOME_LEN,
+    PGAP_MIN_GENOME_LEN,
+)
+from data_assembly.profiling import timed
+from data_assembly.sequence_store import SequenceStore
+
+if TYPE_CHECKING:
+    from data_assembly.dedup import GenomeFingerprint
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    filename=(Path(__file__).parents[2] / Path("log/fasta.log")),
-    encoding="utf-8",
-    level=logging.DEBUG,
-)
 
 
 def format_debug_message(file_name: str, seq_access: str, debug_msg: str) -> str:
@@ -19,96 +30,307 @@ def format_debug_message(file_name: str, seq_access: str, debug_msg: str) -> str
     return message
 
 
+class CleaningReport:
+    """Counters of the cleaning of a genome.
+
+    Counters are updated while the genome is cleaned, so that a single record
+    sums up each genome instead of a debug message for each change. The
+    `final_length` counts the bases written, 0 for a genome out of the PGAP
+    limits. A written genome also gets the fingerprints of its cleaned sequences, see
+    `GenomeFingerprint`, and the genome of which it is a duplicate, if any,
+    kept in the JSON report but not in the tsv table.
+    """
+
+    FIELDS = (
+        "genome",
+        "status",
+        "contigs_in",
+        "contigs_dropped",
+        "bases_in",
+        "bases_trimmed",
+        "n_runs_collapsed",
+        "n_removed",
+        "final_length",
+    )
+    HASH_FIELDS = ("genome_hash", "contig_hashes", "duplicate_of")
+
+    def __init__(
+        self,
+        genome: str | None = None,
+        status: str = "",
+        genome_hash: str = "",
+        contig_hashes: list[str] | None = None,
+        duplicate_of: str = "",
+        **counters: int,
+    ):
+        self.genome: str | None = genome
+        self.status: str = status
+        self.genome_hash: str = genome_hash
+        self.contig_hashes: list[str] = contig_hashes or []
+        self.duplicate_of: str = duplicate_of
+        self.contigs_in: int = 0
+        self.contigs_dropped: int = 0
+        self.bases_in: int = 0
+        self.bases_trimmed: int = 0
+        self.n_runs_collapsed: int = 0
+        self.n_removed: int = 0
+        self.final_length: int = 0
+        for name, value in counters.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def from_dict(cls, report: dict) -> Self:
+        """Create a report from the dict written by `to_dict`."""
+        return cls(**report)
+
+    def to_dict(self) -> dict:
+        """Get the report as a dict, with the fingerprints when there are."""
+        report = {field: getattr(self, field) for field in self.FIELDS}
+        for field in self.HASH_FIELDS:
+            if getattr(self, field):
+                report[field] = getattr(self, field)
+        return report
+
+    def as_duplicate(self, genome: str) -> Self:
+        """Get the report of a genome identical to the one of this report."""
+        return type(self).from_dict(
+            {**self.to_dict(), "genome": genome, "duplicate_of": self.genome}
+        )
+
+    def set_fingerprint(self, fingerprint: "GenomeFingerprint"):
+        """Keep the fingerprints of the sequences written."""
+        self.genome_hash = fingerprint.genome
+        self.contig_hashes = fingerprint.contigs
+
+    def to_json(self) -> str:
+        """Get the report as a JSON object."""
+        import json
+
+        return json.dumps(self.to_dict())
+
+    def to_tsv(self) -> str:
+        """Get the report as a tsv line, without line break."""
+        return "\t".join(str(getattr(self, field)) for field in self.FIELDS)
+
+
+def write_cleaning_reports(reports: Iterable[CleaningReport], output_path: Path):
+    """Write cleaning reports, one JSON object by line or as a tsv table.
+
+    The reports are written as JSON lines when the name of the file ends with
+    `.json` or `.jsonl`, as a tsv table with a header otherwise.
+    """
+    with output_path.open("w+") as f:
+        if output_path.suffix in (".json", ".jsonl"):
+            for report in reports:
+                f.write(report.to_json() + "\n")
+        else:
+            f.write("\t".join(CleaningReport.FIELDS) + "\n")
+            for report in reports:
+                f.write(report.to_tsv() + "\n")
+
+
+def iter_fasta_records(fasta: Path | BinaryIO) -> Iterator[tuple[str, str]]:
+    """Iterate over the records of a fasta file.
+
+    Records are yielded one at a time as (title, sequence) tuples, the title
+    without its leading `>`. Lines of a sequence are buffered and joined once
+    the record is complete so only one sequence is held in memory at a time.
+    `fasta` is a path, read with gzip and BGZF compressed files decompressed
+    on the fly, or an already opened binary stream, closed once read.
+    """
+    title = None
+    chunks = []
+    if isinstance(fasta, Path):
+        from data_assembly.compression import open_input
+
+        fasta = open_input(fasta)
+    with io.TextIOWrapper(fasta, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line.startswith(">"):
+                if title is not None:
+                    yield title, "".join(chunks)
+                title = line[1:]
+                chunks = []
+            elif title is not None:
+                chunks.append(line)
+    if title is not None:
+        yield title, "".join(chunks)
+
+
+def get_tmp_path(output_path: Path) -> Path:
+    """Get a unique temporary path to write `output_path` in before renaming it."""
+    import uuid
+
+    return output_path.parent / Path(
+        f".{output_path.stem}.{uuid.uuid4().hex}{output_path.suffix}"
+    )
+
+
+def write_fasta_records(
+    f: BinaryIO,
+    records: Iterable[tuple[str, str | bytes | memoryview]],
+    line_width: int = 50,
+    buffer_size: int = 1 << 20,
+):
+    """Write (title, sequence) records in a binary file.
+
+    Lines are copied from a view of each sequence in a single output buffer,
+    written to the file each time it holds `buffer_size` bytes.
+    """
+    buffer = bytearray()
+    for title, seq in records:
+        buffer += b">"
+        buffer += title.encode("utf-8")
+        buffer += b"\n"
+        view = memoryview(seq.encode("ascii") if isinstance(seq, str) else seq)
+        for i in range(0, len(view), line_width):
+            buffer += view[i : i + line_width]
+            buffer += b"\n"
+            if len(buffer) >= buffer_size:
+                f.write(buffer)
+                buffer.clear()
+    f.write(buffer)
+
+
 class Fasta:
-    """Represent a FASTA file."""
+    """Represent a FASTA file.
 
-    def __init__(self, sequences: list, titles: list, stem: str | None = None):
-        self.sequences: list = sequences
+    Sequences are either a list of `str` or, to hold many genomes in memory, a
+    `SequenceStore` where trimming and filtering do not copy the sequences.
+    """
+
+    def __init__(
+        self,
+        sequences: list | SequenceStore,
+        titles: list,
+        stem: str | None = None,
+    ):
+        self.sequences: list | SequenceStore = sequences
         self.titles: list = titles
         self.stem: str = stem
 
     @classmethod
-    def from_fasta_file(cls, fasta_path: Path) -> Self:
-        """Parse a fasta file and create an instance of Self."""
+    def from_records(
+        cls,
+        records: Iterable[tuple[str, str]],
+        stem: str | None = None,
+        storage: str = "str",
+    ) -> Self:
+        """Create an instance of Self from (title, sequence) records.
+
+        `storage` is "str" to keep sequences in a list or "bytes" to keep them
+        in a `SequenceStore`.
+        """
+        if storage == "str":
+            sequences = []
+        elif storage == "bytes":
+            sequences = SequenceStore(bytearray(), [])
+        else:
+            raise ValueError(f"Unknown sequence storage: {storage}")
         titles = []
-        sequences = []
-        seq = ""
-        with fasta_path.open("r") as f:
-            for line in f.readlines():
-                if ">" in line:
-                    if seq != "":
-                        sequences.append(seq)
-                    titles.append(line.replace("\n", "")[1:])
-                    seq = ""
-                else:
-                    seq += line.replace("\n", "")
-        if seq != "":
+        for title, seq in records:
+            titles.append(title)
             sequences.append(seq)
-        return cls(sequences, titles, fasta_path.stem)
+        return cls(sequences, titles, stem)
+
+    @classmethod
+    @timed("Fasta.from_fasta_file")
+    def from_fasta_file(cls, fasta_path: Path, storage: str = "str") -> Self:
+        """Parse a fasta file and create an instance of Self."""
+        return cls.from_records(
+            iter_fasta_records(fasta_path), fasta_path.stem, storage
+        )
+
+    @property
+    def lengths(self) -> list[int]:
+        """Get the length of each sequence without copying them."""
+        if isinstance(self.sequences, SequenceStore):
+            return self.sequences.lengths
+        return [len(seq) for seq in self.sequences]
 
-    def remove_seq_too_short(self, threshold: int = 2000):
+    def _select(self, indices: list[int]):
+        """Keep only the sequences and titles at `indices`."""
+        if isinstance(self.sequences, SequenceStore):
+            self.sequences = self.sequences.select(indices)
+        else:
+            self.sequences = [self.sequences[i] for i in indices]
+        self.titles = [self.titles[i] for i in indices]
+
+    @timed("Fasta.remove_seq_too_short")
+    def remove_seq_too_short(self, threshold: int = MIN_SEQUENCE_LEN):
         """Remove sequences with length less than `threshold`.
 
         PGAP input files need to have sequences with more than 200 nucleotides.
         """
-        sequences = []
-        titles = []
-        for i, seq in enumerate(self.sequences):
-            if len(seq) >= threshold:
-                sequences.append(seq)
-                titles.append(self.titles[i])
-            else:
+        kept = []
+        for i, seq_len in enumerate(self.lengths):
+            if seq_len >= threshold:
+                kept.append(i)
+            elif logger.isEnabledFor(logging.DEBUG):
                 msg = format_debug_message(
                     self.stem,
-                    self.titles[i].split(" ")[0][1:],
+                    self.titles[i].split(" ")[0],
                     f"Removed sequence because it was too short (threshold = {threshold})",
                 )
                 logger.debug(msg)
-        self.sequences = sequences
-        self.titles = titles
+        self._select(kept)
 
+    @timed("Fasta.remove_first_last_n")
     def remove_first_last_n(self):
         """Remove first and last nucleotides in sequences being N."""
+        if isinstance(self.sequences, SequenceStore):
+            self.sequences = self.sequences.strip_n()
+            self._select([i for i, seq_len in enumerate(self.lengths) if seq_len])
+            return
         new_seqs = []
         for i, seq in enumerate(self.sequences):
-            n_id_min = 0
-            n_id_max = len(seq) - 1
-            while seq[n_id_min] == "N":
-                n_id_min += 1
-            while seq[n_id_max] == "N":
-                n_id_max -= 1
-
-            new_seq = seq[n_id_min : n_id_max + 1 :]
-            if n_id_min != 0 or n_id_max != len(seq) - 1:
+            new_seq = seq.strip("N")
+            if logger.isEnabledFor(logging.DEBUG) and len(new_seq) != len(seq):
+                n_start = len(seq) - len(seq.lstrip("N"))
                 msg = format_debug_message(
                     self.stem,
-                    self.titles[i].split(" ")[0][1:],
-                    f"Sequences had {n_id_min} n at the beginning and {len(seq) - 1 - n_id_max} at the end",
+                    self.titles[i].split(" ")[0],
+                    f"Sequences had {n_start} n at the beginning and {len(seq) - len(new_seq) - n_start} at the end",
                 )
                 logger.debug(msg)
-            if new_seq != 0:
-                new_seqs.append(new_seq)
-            else:
-                self.titles.pop(i)
+            new_seqs.append(new_seq)
         self.sequences = new_seqs
+        self._select([i for i, seq in enumerate(new_seqs) if seq])
 
-    def to_fasta_file(self, output_path: Path):
-        """Write the fasta in a fasta file."""
-        new_output_path = output_path
-        if output_path.exists():
-            msg = format_debug_message(output_path.stem, "", "File exist already.")
-            logger.debug(msg)
-            new_output_path = output_path.parent / Path(
-                output_path.stem + "_1" + output_path.suffix
-            )
-        with new_output_path.open("w+") as f:
-            for title, seq in zip(self.titles, self.sequences, strict=True):
-                title = f">{title}"
-                sequences = [
-                    seq[i : min(i + 50, len(seq))] + "\n"
-                    for i in range(0, len(seq), 50)
-                ]
-                f.writelines([title + "\n", *sequences])
+    @timed("Fasta.to_fasta_file")
+    def to_fasta_file(
+        self,
+        output_path: Path,
+        compresslevel: int | None = None,
+        bgzf: bool = False,
+        line_width: int = 50,
+    ) -> Path:
+        """Write the fasta in a fasta file and return the path written.
+
+        The file is written in a temporary file of the same directory, renamed
+        once complete so that `output_path` is never left half written. An
+        existing file is replaced. The file is gzip compressed when its name
+        ends with `.gz` or when `compresslevel` is given, and BGZF compressed
+        when `bgzf` is set.
+        """
+        if isinstance(self.sequences, SequenceStore):
+            sequences = map(self.sequences.view, range(len(self.sequences)))
+        else:
+            sequences = self.sequences
+        from data_assembly.compression import open_output
+
+        tmp_path = get_tmp_path(output_path)
+        try:
+            with open_output(tmp_path, compresslevel, bgzf) as f:
+                write_fasta_records(
+                    f, zip(self.titles, sequences, strict=True), line_width
+                )
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return output_path
 
     @property
     def in_pgap_range(self) -> bool:
@@ -116,73 +338,522 @@ class Fasta:
 
         PGAP limits are 10e3 and 100e6.
         """
-        genome_len = 0
-        for seq in self.sequences:
-            genome_len += len(seq)
-        return 10e3 < genome_len and genome_len < 100e6
+        genome_len = sum(self.lengths)
+        return PGAP_MIN_GENOME_LEN < genome_len and genome_len < PGAP_MAX_GENOME_LEN
 
+    @timed("Fasta.remove_all_n_seq")
     def remove_all_n_seq(self):
         """Remove sequences with only n in it."""
+        kept = []
         for i, seq in enumerate(self.sequences):
-            remove = True
-            for elem in seq:
-                if elem != "N":
-                    remove = False
-                    break
-            if remove:
+            if seq.count("N") != len(seq):
+                kept.append(i)
+            elif logger.isEnabledFor(logging.DEBUG):
                 msg = format_debug_message(
                     self.stem,
-                    self.titles[i].split(" ")[0][1:],
+                    self.titles[i].split(" ")[0],
                     "Removed seq with because it was only N.",
                 )
                 logger.debug(msg)
-                self.sequences.pop(i)
-                self.titles.pop(i)
+        self._select(kept)
 
-    def reduce_successives_n(self, limit=9):
+    @timed("Fasta.reduce_successives_n")
+    def reduce_successives_n(self, limit=N_RUN_LIMIT):
         """Reduce the number of successives N in a sequence.
 
         The `limit` parameter define the limit when all N after this one will be removed.
         """
-        n_id = 0
+        if isinstance(self.sequences, SequenceStore):
+            self.sequences = self.sequences.collapse_n_runs(limit)
+            return
         new_sequences = []
         for i, seq in enumerate(self.sequences):
-            new_seq = ""
-            for j, elem in enumerate(seq):
-                if elem == "N":
-                    n_id += 1
-                else:
-                    n_id = 0
-                if n_id <= limit:
-                    new_seq += elem
-                else:
-                    msg = format_debug_message(
-                        self.stem,
-                        self.titles[i].split(" ")[0][1:],
-                        f"Reducing number of n in the sequence at the {j} pos",
-                    )
-                    logger.debug(msg)
+            new_seq = collapse_n_runs(seq, limit)
+            if len(new_seq) != len(seq) and logger.isEnabledFor(logging.DEBUG):
+                msg = format_debug_message(
+                    self.stem,
+                    self.titles[i].split(" ")[0],
+                    f"Removed {len(seq) - len(new_seq)} n from runs longer than {limit}",
+                )
+                logger.debug(msg)
             new_sequences.append(new_seq)
         self.sequences = new_sequences
 
 
-def parse_genome(args: tuple[Path, Path]):
-    """Parse a genome and create its correct version for pgap."""
+_N_RUN = re.compile(b"N+")
+
+
+@functools.cache
+def _n_run_pattern(limit: int, as_bytes: bool = False) -> re.Pattern:
+    """Compile the pattern matching runs of more than `limit` N.
+
+    The run is spelled as a literal prefix rather than `N{limit+1,}` so that
+    the regex engine can jump between candidate positions with a fast search.
+    The pattern matches bytes with `as_bytes`, str otherwise.
+    """
+    pattern = "N" * limit + "N+"
+    return re.compile(pattern.encode("ascii") if as_bytes else pattern)
+
+
+def collapse_n_runs(seq: str, limit: int = N_RUN_LIMIT) -> str:
+    """Keep at most `limit` successive N in each run of N of a sequence."""
+    return count_collapse_n_runs(seq, limit)[0]
+
+
+def count_collapse_n_runs(seq: str, limit: int = N_RUN_LIMIT) -> tuple[str, int]:
+    """Collapse the runs of N like `collapse_n_runs` and count the runs changed."""
+    if "N" * (limit + 1) not in seq:
+        return seq, 0
+    return _n_run_pattern(limit).subn("N" * limit, seq)
+
+
+def clean_records(
+    records: Iterable[tuple[str, str]],
+    stem: str | None = None,
+    limit: int = N_RUN_LIMIT,
+    threshold: int = MIN_SEQUENCE_LEN,
+    report: CleaningReport | None = None,
+) -> Iterator[tuple[str, str]]:
+    """Clean fasta records for PGAP in a single pass.
+
+    Each record has its leading and trailing N removed, its runs of N reduced
+    to `limit` and is dropped if its length is less than `threshold`. This is
+    the same as calling `remove_first_last_n`, `reduce_successives_n` and
+    `remove_seq_too_short` on a `Fasta`, one record at a time. What is removed
+    is counted in `report` when given, and only logged for each record when
+    debug logging is enabled.
+    """
+    if report is None:
+        report = CleaningReport(stem)
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for title, seq in records:
+        report.contigs_in += 1
+        report.bases_in += len(seq)
+        trimmed = seq.strip("N")
+        report.bases_trimmed += len(seq) - len(trimmed)
+        if debug and len(trimmed) != len(seq):
+            n_start = len(seq) - len(seq.lstrip("N"))
+            msg = format_debug_message(
+                stem,
+                title.split(" ")[0],
+                f"Sequences had {n_start} n at the beginning and {len(seq) - len(trimmed) - n_start} at the end",
+            )
+            logger.debug(msg)
+        seq, n_runs = count_collapse_n_runs(trimmed, limit)
+        report.n_runs_collapsed += n_runs
+        report.n_removed += len(trimmed) - len(seq)
+        if len(seq) >= threshold:
+            report.final_length += len(seq)
+            yield title, seq
+        else:
+            report.contigs_dropped += 1
+            if debug:
+                msg = format_debug_message(
+                    stem,
+                    title.split(" ")[0],
+                    f"Removed sequence because it was too short (threshold = {threshold})",
+                )
+                logger.debug(msg)
+
+
+def get_parsed_genome_name(genome_name: str, compress: bool = False) -> str:
+    """Get the file name of a cleaned genome from the name of the genome file.
+
+    With `compress`, `.gz` is added to a name which does not end with it.
+    """
+    genome_path = Path(genome_name)
+    name = "GCR_" + "_".join(genome_path.stem.split("_")[1:]) + genome_path.suffix
+    if compress and genome_path.suffix != ".gz":
+        name += ".gz"
+    return name
+
+
+def clean_genome(
+    records: Iterable[tuple[str, str]],
+    output_path: Path,
+    stem: str | None = None,
+    report: CleaningReport | None = None,
+    compresslevel: int | None = None,
+    bgzf: bool = False,
+) -> Path | None:
+    """Clean the records of a genome and write them if it fits PGAP limits.
+
+    Each record is written as soon as it is cleaned in a temporary file,
+    removed when the genome is out of the PGAP limits, so that only one
+    sequence is held in memory. The genome is abandoned as soon as its cleaned
+    length exceeds the upper limit. The cleaning is counted in `report` when
+    given, with its status. The file is compressed as by `Fasta.to_fasta_file`
+    with `compresslevel` and `bgzf`. Return the path of the written file, if
+    any.
+    """
+    from data_assembly.compression import open_output
+    from data_assembly.dedup import GenomeFingerprint
+
+    if report is None:
+        report = CleaningReport(stem)
+    genome_len = 0
+    fingerprint = GenomeFingerprint()
+
+    def iter_kept() -> Iterator[tuple[str, bytes]]:
+        nonlocal genome_len
+        for title, seq in clean_records(records, stem, report=report):
+            genome_len += len(seq)
+            if genome_len >= PGAP_MAX_GENOME_LEN:
+                report.status = "too long"
+                return
+            seq = seq.encode("ascii")
+            fingerprint.add_contig(seq)
+            yield title, seq
+
+    tmp_path = get_tmp_path(output_path)
+    try:
+        with (
+            timed("clean_genome", genome=stem),
+            open_output(tmp_path, compresslevel, bgzf) as f,
+        ):
+            write_fasta_records(f, iter_kept())
+        if report.status != "too long" and genome_len <= PGAP_MIN_GENOME_LEN:
+            report.status = "too short"
+        if report.status:
+            report.final_length = 0
+            msg = format_debug_message(
+                stem,
+                "",
+                f"Remove all genome because it was {report.status}.",
+            )
+            logger.debug(msg)
+            tmp_path.unlink()
+            return None
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    report.status = "written"
+    report.set_fingerprint(fingerprint)
+    return output_path
+
+
+def iter_fasta_chunks(
+    fasta: Path | BinaryIO, chunk_size: int = CHUNK_SIZE
+) -> Iterator[tuple[str | None, bytes]]:
+    """Iterate over the records of a fasta file in chunks of at most `chunk_size`.
+
+    A `(title, b"")` tuple is yielded when a record starts, followed by
+    `(None, chunk)` tuples for the pieces of its sequence, line breaks removed.
+    The file is read by blocks of `chunk_size` bytes, so even a sequence on a
+    single line is never held in memory as a whole. `fasta` is opened like in
+    `iter_fasta_records`.
+    """
+    if isinstance(fasta, Path):
+        from data_assembly.compression import open_input
+
+        fasta = open_input(fasta)
+    title = None
+    in_title = False
+    with fasta as f:
+        while block := f.read(chunk_size):
+            pos = 0
+            pieces = []
+            while pos < len(block):
+                if in_title:
+                    end = block.find(b"\n", pos)
+                    if end == -1:
+                        title += block[pos:]
+                        break
+                    title += block[pos:end]
+                    in_title = False
+                    pos = end + 1
+                    yield title.rstrip(b"\r").decode("utf-8"), b""
+                    continue
+                start = block.find(b">", pos)
+                end = len(block) if start == -1 else start
+                if title is not None:
+                    pieces.append(block[pos:end].translate(None, b"\r\n"))
+                if start == -1:
+                    break
+                if pieces:
+                    yield None, b"".join(pieces)
+                    pieces = []
+                title = b""
+                in_title = True
+                pos = start + 1
+            if pieces:
+                yield None, b"".join(pieces)
+    if in_title:
+        yield title.rstrip(b"\r").decode("utf-8"), b""
+
+
+class NRunCleaner:
+    """Trim and collapse the runs of N of a sequence given chunk by chunk.
+
+    A run of N is only counted, not kept, until the next base shows whether it
+    is inside the sequence, where it is reduced to `limit` N, or at its end,
+    where it is trimmed. A run spanning several chunks is thus handled like
+    in a single pass on the whole sequence, holding only its length.
+    """
+
+    def __init__(self, limit: int = N_RUN_LIMIT, report: CleaningReport | None = None):
+        self.limit: int = limit
+        self.report: CleaningReport = report or CleaningReport()
+        self.started: bool = False
+        self.n_run: int = 0
+
+    def feed(self, chunk: bytes) -> bytes:
+        """Clean the next chunk and return what is known to be kept of it."""
+        out = bytearray()
+        pos = 0
+        while (start := chunk.find(b"N", pos)) != -1:
+            if start > pos:
+                self._flush_n_run(out)
+                out += chunk[pos:start]
+            pos = _N_RUN.match(chunk, start).end()
+            self.n_run += pos - start
+        if pos < len(chunk):
+            self._flush_n_run(out)
+            out += chunk[pos:]
+        return bytes(out)
+
+    def _flush_n_run(self, out: bytearray):
+        """Write the current run of N, followed by a base, reduced to `limit`."""
+        if self.started and self.n_run:
+            out += b"N" * min(self.n_run, self.limit)
+            if self.n_run > self.limit:
+                self.report.n_runs_collapsed += 1
+                self.report.n_removed += self.n_run - self.limit
+        else:
+            self.report.bases_trimmed += self.n_run
+        self.started = True
+        self.n_run = 0
+
+    def finish(self):
+        """Trim the run of N ending the sequence and get ready for the next one."""
+        self.report.bases_trimmed += self.n_run
+        self.started = False
+        self.n_run = 0
+
+
+class LineWriter:
+    """Write fasta records given chunk by chunk, with lines of `line_width`."""
+
+    def __init__(self, f: BinaryIO, line_width: int = 50, buffer_size: int = 1 << 20):
+        self.f: BinaryIO = f
+        self.line_width: int = line_width
+        self.buffer_size: int = buffer_size
+        self.buffer: bytearray = bytearray()
+        self.column: int = 0
+
+    def write_title(self, title: str):
+        """Start a new record."""
+        self.end_record()
+        self.buffer += b">" + title.encode("utf-8") + b"\n"
+
+    def write(self, seq: bytes):
+        """Write the next chunk of the sequence of the record."""
+        view = memoryview(seq)
+        start = 0
+        if self.column:
+            start = min(self.line_width - self.column, len(view))
+            self.buffer += view[:start]
+            self.column += start
+            if self.column < self.line_width:
+                return
+            self.buffer += b"\n"
+        end = len(view) - (len(view) - start) % self.line_width
+        for i in range(start, end, self.line_width):
+            self.buffer += view[i : i + self.line_width]
+            self.buffer += b"\n"
+        self.buffer += view[end:]
+        self.column = len(view) - end
+        if len(self.buffer) >= self.buffer_size:
+            self.f.write(self.buffer)
+            self.buffer.clear()
+
+    def end_record(self):
+        """End the last line of the record."""
+        if self.column:
+            self.buffer += b"\n"
+            self.column = 0
+
+    def flush(self):
+        """Write what is buffered in the file."""
+        self.end_record()
+        self.f.write(self.buffer)
+        self.buffer.clear()
+
+
+def clean_genome_chunked(
+    fasta: Path | BinaryIO,
+    output_path: Path,
+    stem: str | None = None,
+    report: CleaningReport | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    limit: int = N_RUN_LIMIT,
+    threshold: int = MIN_SEQUENCE_LEN,
+    compresslevel: int | None = None,
+    bgzf: bool = False,
+) -> Path | None:
+    """Clean a genome like `clean_genome`, holding at most a few chunks in memory.
+
+    The genome is read by chunks of `chunk_size` bytes and each chunk is
+    cleaned and written as soon as its record is known to be kept, that is
+    once `threshold` bases of the record were kept. The output is written in a
+    temporary file, removed when the genome is out of the PGAP limits. The
+    sequences written are hashed on the way, see `GenomeFingerprint`.
+    Return the path of the written file, if any.
+    """
+    from data_assembly.compression import open_output
+    from data_assembly.dedup import GenomeFingerprint
+
+    if report is None:
+        report = CleaningReport(stem)
+    cleaner = NRunCleaner(limit, report)
+    fingerprint = GenomeFingerprint()
+    title = None
+    head = []
+    seq_len = 0
+
+    def end_record():
+        cleaner.finish()
+        if title is None:
+            return
+        fingerprint.end_contig(keep=seq_len >= threshold)
+        if seq_len < threshold:
+            report.contigs_dropped += 1
+        else:
+            report.final_length += seq_len
+            writer.end_record()
+
+    tmp_path = get_tmp_path(output_path)
+    try:
+        with (
+            timed("clean_genome_chunked", genome=stem),
+            open_output(tmp_path, compresslevel, bgzf) as f,
+        ):
+            writer = LineWriter(f)
+            for record_title, chunk in iter_fasta_chunks(fasta, chunk_size):
+                if record_title is not None:
+                    end_record()
+                    title, head, seq_len = record_title, [], 0
+                    report.contigs_in += 1
+                    fingerprint.start_contig()
+                    continue
+                report.bases_in += len(chunk)
+                kept = cleaner.feed(chunk)
+                fingerprint.update(kept)
+                seq_len += len(kept)
+                if seq_len < threshold:
+                    head.append(kept)
+                    continue
+                if head is not None:
+                    writer.write_title(title)
+                    writer.write(b"".join(head))
+                    head = None
+                writer.write(kept)
+                if report.final_length + seq_len >= PGAP_MAX_GENOME_LEN:
+                    report.status = "too long"
+                    break
+            else:
+                end_record()
+            writer.flush()
+        if report.status == "too long":
+            report.final_length = 0
+            logger.debug(f"Remove all genome {stem} because it was too long.")
+            tmp_path.unlink()
+            return None
+        if report.final_length <= PGAP_MIN_GENOME_LEN:
+            report.status = "too short"
+            report.final_length = 0
+            logger.debug(f"Remove all genome {stem} because it was too short.")
+            tmp_path.unlink()
+            return None
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    report.status = "written"
+    report.set_fingerprint(fingerprint)
+    return output_path
+
+
+def fingerprint_fasta(
+    fasta: Path | BinaryIO, chunk_size: int = CHUNK_SIZE
+) -> "GenomeFingerprint":
+    """Hash the sequences of a fasta file read by chunks, see `GenomeFingerprint`.
+
+    A genome written by `parse_genome` has the fingerprint of its report.
+    """
+    from data_assembly.dedup import GenomeFingerprint
+
+    fingerprint = GenomeFingerprint()
+    in_record = False
+    for title, chunk in iter_fasta_chunks(fasta, chunk_size):
+        if title is None:
+            fingerprint.update(chunk)
+            continue
+        if in_record:
+            fingerprint.end_contig()
+        fingerprint.start_contig()
+        in_record = True
+    if in_record:
+        fingerprint.end_contig()
+    return fingerprint
+
+
+def parse_genome(
+    args: tuple[Path, Path],
+    report: CleaningReport | None = None,
+    chunk_size: int | None = None,
+    compresslevel: int | None = None,
+    bgzf: bool = False,
+) -> Path | None:
+    """Parse a genome and create its correct version for pgap.
+
+    Records are cleaned as they are read. The genome is abandoned as soon as
+    it is known to be out of the PGAP limits: before reading when the file is
+    too small to hold enough nucleotides, and while reading once the upper
+    limit is exceeded. Return the path of the written file, if any.
+
+    A compressed genome is written compressed with the same extension. With
+    `compresslevel` or `bgzf` the cleaned genome is compressed at this level
+    or as BGZF, `.gz` being added to its name if needed. The cleaning is
+    counted in `report` when given. With `chunk_size` the genome is streamed
+    by chunks of this size, see `clean_genome_chunked`, instead of holding
+    each of its sequences in memory.
+    """
+    from data_assembly.compression import is_gzip
+
     (genome_path, parsed_dir) = args
-    fasta_file = Fasta.from_fasta_file(genome_path)
-    fasta_file.remove_first_last_n()
-    fasta_file.reduce_successives_n()
-    fasta_file.remove_seq_too_short()
-    if fasta_file.in_pgap_range:
-        genome_name = "GCR_" + "_".join(genome_path.stem.split("_")[1:])
-        fasta_file.to_fasta_file(
-            (parsed_dir / Path(f"{genome_name}{genome_path.suffix}"))
-        )
-    else:
+    if report is None:
+        report = CleaningReport(genome_path.stem)
+    if genome_path.stat().st_size <= PGAP_MIN_GENOME_LEN and not is_gzip(genome_path):
+        report.status = "too short"
         msg = format_debug_message(
             genome_path.stem,
             "",
             "Remove all genome because it was too short.",
         )
-
         logger.debug(msg)
+        return None
+
+    output_path = parsed_dir / Path(
+        get_parsed_genome_name(genome_path.name, compresslevel is not None or bgzf)
+    )
+    with timed("parse_genome", genome=genome_path.stem):
+        if chunk_size is not None:
+            return clean_genome_chunked(
+                genome_path,
+                output_path,
+                genome_path.stem,
+                report,
+                chunk_size,
+                compresslevel=compresslevel,
+                bgzf=bgzf,
+            )
+        return clean_genome(
+            iter_fasta_records(genome_path),
+            output_path,
+            genome_path.stem,
+            report,
+            compresslevel,
+            bgzf,
+        )
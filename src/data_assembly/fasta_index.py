@@ -0,0 +1,177 @@
+"""Random access to fasta files through a samtools compatible `.fai` index."""
+
+import logging
+import mmap
+from pathlib import Path
+from typing import NamedTuple, Self
+from data_assembly.compression import is_gzip
+from data_assembly.config import PGAP_MAX_GENOME_LEN, PGAP_MIN_GENOME_LEN
+
+logger = logging.getLogger(__name__)
+
+
+class FaiRecord(NamedTuple):
+    """A line of a `.fai` index.
+
+    `offset` is the position of the first base of the sequence in the file,
+    `line_bases` the number of bases per line and `line_width` the number of
+    bytes per line, end of line included.
+    """
+
+    name: str
+    length: int
+    offset: int
+    line_bases: int
+    line_width: int
+
+
+def get_fai_path(fasta_path: Path) -> Path:
+    """Get the path of the index of a fasta file."""
+    return fasta_path.parent / Path(fasta_path.name + ".fai")
+
+
+def build_fai(fasta_path: Path) -> list[FaiRecord]:
+    """Index a fasta file.
+
+    Lines are only measured, never decoded. As with `samtools faidx`, every
+    line of a sequence but the last one must have the same length.
+    """
+    if is_gzip(fasta_path):
+        raise ValueError(f"Cannot index the compressed fasta file {fasta_path}.")
+    records = []
+    name = None
+    with fasta_path.open("rb") as f:
+        position = 0
+        for line in f:
+            if line.startswith(b">"):
+                if name is not None:
+                    records.append(
+                        FaiRecord(name, length, offset, line_bases, line_width)
+                    )
+                header = line[1:].split(maxsplit=1)
+                name = header[0].decode() if header else ""
+                length = line_bases = line_width = 0
+                offset = position + len(line)
+                ended = False
+            elif name is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if line_width == 0:
+                    line_bases = bases
+                    line_width = len(line)
+                elif ended and bases or bases > line_bases:
+                    raise ValueError(
+                        f"Different line length in sequence {name} of {fasta_path}."
+                    )
+                elif bases != line_bases or len(line) != line_width:
+                    ended = True
+                length += bases
+            position += len(line)
+    if name is not None:
+        records.append(FaiRecord(name, length, offset, line_bases, line_width))
+    return records
+
+
+def read_fai(fai_path: Path) -> list[FaiRecord]:
+    """Read a `.fai` index."""
+    records = []
+    with fai_path.open("r") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            records.append(FaiRecord(fields[0], *map(int, fields[1:5])))
+    return records
+
+
+def write_fai(records: list[FaiRecord], fai_path: Path):
+    """Write a `.fai` index."""
+    with fai_path.open("w+") as f:
+        f.writelines("\t".join(map(str, record)) + "\n" for record in records)
+
+
+def load_fai(fasta_path: Path) -> list[FaiRecord]:
+    """Get the index of a fasta file, building it if missing or outdated.
+
+    The index is written next to the fasta file when the directory allows it.
+    """
+    fai_path = get_fai_path(fasta_path)
+    if fai_path.exists() and fai_path.stat().st_mtime >= fasta_path.stat().st_mtime:
+        return read_fai(fai_path)
+    records = build_fai(fasta_path)
+    try:
+        write_fai(records, fai_path)
+    except OSError:
+        logger.warning(f"Could not write the index {fai_path}.")
+    return records
+
+
+def genome_length(fasta_path: Path) -> int:
+    """Get the number of nucleotides of a genome from its index."""
+    return sum(record.length for record in load_fai(fasta_path))
+
+
+class IndexedFasta:
+    """A fasta file opened with `mmap` and accessed through its index.
+
+    Lengths are read from the index and subsequences are sliced out of the
+    mapped file, so nothing is decoded but the bases fetched. When names are
+    duplicated, only the first sequence can be fetched by name.
+    """
+
+    def __init__(self, fasta_path: Path):
+        self.path: Path = fasta_path
+        self.records: list[FaiRecord] = load_fai(fasta_path)
+        self.index: dict[str, FaiRecord] = {}
+        for record in self.records:
+            self.index.setdefault(record.name, record)
+        self._file = fasta_path.open("rb")
+        if fasta_path.stat().st_size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._mmap = b""
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Unmap and close the fasta file."""
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    @property
+    def lengths(self) -> list[int]:
+        """Get the length of each sequence."""
+        return [record.length for record in self.records]
+
+    @property
+    def genome_length(self) -> int:
+        """Get the number of nucleotides of the genome."""
+        return sum(self.lengths)
+
+    @property
+    def in_pgap_range(self) -> bool:
+        """Get if the genome len is in ranges of PGAP limits."""
+        return PGAP_MIN_GENOME_LEN < self.genome_length < PGAP_MAX_GENOME_LEN
+
+    def _position(self, record: FaiRecord, base: int) -> int:
+        """Get the position in the file of a base of a sequence."""
+        line, column = divmod(base, record.line_bases)
+        return record.offset + line * record.line_width + column
+
+    def fetch(self, name: str, start: int = 0, end: int | None = None) -> bytes:
+        """Get the bases between `start` and `end` (0-based, end excluded)."""
+        record = self.index[name]
+        end = record.length if end is None else min(end, record.length)
+        start = max(start, 0)
+        if start >= end:
+            return b""
+        positions = []
+        while start < end:
+            line_end = min(end, (start // record.line_bases + 1) * record.line_bases)
+            position = self._position(record, start)
+            positions.append((position, position + line_end - start))
+            start = line_end
+        with memoryview(self._mmap) as view:
+            return b"".join([view[i:j] for i, j in positions])
@@ -1,57 +1,66 @@
 """Utilities to use pgap to annotate a genome."""
 
+import copy
+import functools
+import os
 from pathlib import Path
 import subprocess
-import csv
 import logging
-from parallelbar import progress_map
-import yaml
+import shutil
+import tempfile
+from data_assembly.assembly_summary import AssemblySummary, scan_genome_dir
+from data_assembly.cache import Cache, cache_key, hash_file
+from data_assembly.config import CACHE_DIR, PGAP_EXECUTABLE
+from data_assembly.profiling import timed
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    filename=(Path(__file__).parents[2] / Path("log/pgap.log")),
-    encoding="utf-8",
-    level=logging.DEBUG,
-)
 
-
-def get_genome_file_from_accession(
-    genome_path: Path, genome_accession: str
-) -> Path | None:
-    """Get the genome file from its genome accession.
-
-    Genome accesion must be include in file name.
-    """
-    for path in genome_path.iterdir():
-        if genome_accession in path.stem:
-            return path
-    return None
+TEMPLATES_DIR = Path(__file__).parents[2] / Path("templates")
+# Names of the files of a PGAP input directory.
+INPUT_YAML = "input.yaml"
+SUBMOL_YAML = "submol.yaml"
 
 
 def get_pgap_inputs(dir_genomes: Path, tsv_path: Path) -> list[tuple[Path, Path, str]]:
-    """Get inputs of the pgap command from a tsv files and input to search genome in."""
+    """Get inputs of the pgap command from a tsv files and input to search genome in.
+
+    The genome directory is listed once and each row of the tsv file is matched
+    to its genome through the accession, each genome being kept once.
+    """
+    summary = AssemblySummary.from_tsv(tsv_path)
+    genome_files = scan_genome_dir(dir_genomes)
     pgap_inputs = []
-    paths = []
-    with tsv_path.open("r") as tsv_file:
-        tsv_reader = csv.reader(tsv_file, delimiter="\t")
-        next(tsv_reader)
-        for line in tsv_reader:
-            genome_accession = line[1]
-            org_name = line[3]
-            strain = line[7]
-            genome_path = get_genome_file_from_accession(
-                dir_genomes, "GCR_" + genome_accession.split("_")[1]
-            )
-            if genome_path and genome_path not in paths:
-                pgap_inputs.append((genome_path, strain, org_name))
-                paths.append(genome_path)
+    paths = set()
+    for genome_accession, org_name, strain in zip(
+        summary.column(1), summary.column(3), summary.column(7)
+    ):
+        genome_path = genome_files.get("GCR_" + genome_accession.split("_")[1])
+        if genome_path and genome_path not in paths:
+            pgap_inputs.append((genome_path, strain, org_name))
+            paths.add(genome_path)
     return pgap_inputs
 
 
-def run_pgap(output_path: Path, input_yaml: Path):
-    """Run pgap."""
-    cmd = f"/home/pgap/pgap.py -n -d -o {str(output_path)} {str(input_yaml)}"
-    process = subprocess.Popen(cmd, text=True, shell=True)
+def get_pgap_command(
+    output_path: Path,
+    input_yaml: Path,
+    cpus: int | None = None,
+    memory_gb: int | None = None,
+    executable: Path = PGAP_EXECUTABLE,
+) -> list[str]:
+    """Get the pgap command, optionally limited in CPUs and memory."""
+    cmd = [str(executable), "-n", "-d"]
+    if cpus is not None:
+        cmd += ["--cpus", str(cpus)]
+    if memory_gb is not None:
+        cmd += ["--memory", f"{memory_gb}g"]
+    return cmd + ["-o", str(output_path), str(input_yaml)]
+
+
+@timed("run_pgap")
+def run_pgap(output_path: Path, input_yaml: Path) -> int:
+    """Run pgap and return its exit status."""
+    process = subprocess.Popen(get_pgap_command(output_path, input_yaml), text=True)
     returncode = process.wait()
 
     if returncode:
@@ -60,92 +69,153 @@ def run_pgap(output_path: Path, input_yaml: Path):
         )
     else:
         logger.debug(f"PGAP runned on the file {output_path.stem} and success.")
+    return returncode
 
 
-def create_input_pgap(genome_path: Path, genus_species: str, strain: str):
-    """Create PGAP input yaml file and its submol."""
-    with (Path(__file__).parents[2] / Path("templates/template_pgap.yaml")).open(
-        "r"
-    ) as f:
-        input_yaml = yaml.safe_load(f)
+@functools.cache
+def load_templates() -> tuple[dict, dict]:
+    """Load the templates of the PGAP input yaml file and of its submol."""
+    # yaml is imported where it is used, so that workers which never write PGAP
+    # inputs do not pay for its import.
+    import yaml
 
-    with (Path(__file__).parents[2] / Path("templates/template_submol.yaml")).open(
-        "r"
-    ) as f:
+    with (TEMPLATES_DIR / Path("template_pgap.yaml")).open("r") as f:
+        input_yaml = yaml.safe_load(f)
+    with (TEMPLATES_DIR / Path("template_submol.yaml")).open("r") as f:
         submol_yaml = yaml.safe_load(f)
+    return input_yaml, submol_yaml
 
-    Path(f"/tmp/{genome_path.stem}").mkdir(exist_ok=False)
-    genome_path.copy(
-        Path(f"/tmp/{genome_path.stem}/{genome_path.stem}{genome_path.suffix}")
-    )
+
+def render_input_pgap(
+    genome_path: Path, genus_species: str, strain: str, input_dir: Path
+) -> tuple[dict, dict]:
+    """Get the content of the PGAP input yaml file and of its submol.
+
+    The templates are loaded once by process and copied for each genome. Files
+    are located in `input_dir`.
+    """
+    input_yaml, submol_yaml = copy.deepcopy(load_templates())
 
     input_yaml["fasta"]["location"] = str(
-        Path(f"/tmp/{genome_path.stem}/{genome_path.stem}{genome_path.suffix}")
+        input_dir / Path(f"{genome_path.stem}{genome_path.suffix}")
     )
-    input_yaml["submol"]["location"] = f"/tmp/{genome_path.stem}/submol.yaml"
+    input_yaml["submol"]["location"] = str(input_dir / Path(SUBMOL_YAML))
 
     submol_yaml["organism"]["genus_species"] = genus_species
     submol_yaml["organism"]["strain"] = strain
+    return input_yaml, submol_yaml
+
+
+def create_input_pgap(
+    genome_path: Path,
+    genus_species: str,
+    strain: str,
+    scratch_dir: Path | None = None,
+) -> Path:
+    """Create PGAP input yaml file and its submol in a new directory.
+
+    The directory is unique to the run, created in `scratch_dir` or in the
+    temporary directory of the system, and is to be removed with
+    `remove_input_pgap` once PGAP is done. The genome is hard linked in the
+    directory, or referenced where it is when it cannot be linked, never
+    copied. Return the directory.
+    """
+    import yaml
+
+    input_dir = Path(
+        tempfile.mkdtemp(prefix=f"pgap_{genome_path.stem}_", dir=scratch_dir)
+    )
+    try:
+        input_yaml, submol_yaml = render_input_pgap(
+            genome_path, genus_species, strain, input_dir
+        )
+        try:
+            os.link(genome_path, input_yaml["fasta"]["location"])
+        except OSError:
+            input_yaml["fasta"]["location"] = str(genome_path.resolve())
+
+        with (input_dir / Path(SUBMOL_YAML)).open("w+") as f:
+            yaml.safe_dump(submol_yaml, f)
+
+        with (input_dir / Path(INPUT_YAML)).open("w+") as f:
+            yaml.safe_dump(input_yaml, f)
+    except BaseException:
+        remove_input_pgap(input_dir)
+        raise
+    return input_dir
+
+
+def get_pgap_cache_key(
+    genome_path: Path, genus_species: str, strain: str, output_path: Path
+) -> str:
+    """Get the key of a PGAP run in the cache.
+
+    Inputs are rendered in a fixed directory, so that the key does not depend
+    on the directory a run gets.
+    """
+    import yaml
+
+    return cache_key(
+        "pgap",
+        hash_file(genome_path),
+        *map(
+            yaml.safe_dump,
+            render_input_pgap(
+                genome_path, genus_species, strain, Path(genome_path.stem)
+            ),
+        ),
+        str(output_path),
+    )
 
-    with Path(f"/tmp/{genome_path.stem}/submol.yaml").open("w+") as f:
-        yaml.safe_dump(submol_yaml, f)
 
-    with Path(f"/tmp/{genome_path.stem}/input.yaml").open("w+") as f:
-        yaml.safe_dump(input_yaml, f)
+def remove_input_pgap(input_dir: Path):
+    """Remove a directory of PGAP input files."""
+    shutil.rmtree(input_dir, ignore_errors=True)
 
 
 def create_imput_and_run_pgap(args):
-    """Create PGAP yaml input file and run it."""
+    """Create PGAP yaml input file and run it.
+
+    PGAP is not run again on a genome it already annotated with the same
+    inputs, as recorded in the cache next to the output directory.
+    """
 
     (genome_path, strain, genus_specied, output_path) = args
-    create_input_pgap(
+    cache = Cache(output_path.parent / CACHE_DIR)
+    key = get_pgap_cache_key(genome_path, genus_specied, strain, output_path)
+    if cache.get(key) is not None:
+        logger.debug(f"PGAP already runned on the file {output_path.stem}.")
+        return
+
+    input_dir = create_input_pgap(
         genome_path=genome_path, genus_species=genus_specied, strain=strain
     )
-    run_pgap(output_path, Path(f"/tmp/{genome_path.stem}/input.yaml"))
-    for path in Path(f"/tmp/{genome_path.stem}").iterdir():
-        path.unlink()
-    Path(f"/tmp/{genome_path.stem}").rmdir()
+    try:
+        returncode = run_pgap(output_path, input_dir / Path(INPUT_YAML))
+    finally:
+        remove_input_pgap(input_dir)
+    if not returncode:
+        cache.record(key, [output_path], genome=str(genome_path))
 
 
 if __name__ == "__main__":
-    # input_path = [
-    #     (path, Path("/data/pgap/parsed_genomes/thermococcales/"))
-    #     for path in Path("/data/pgap/input_genomes/thermococcales/").iterdir()
-    # ]
-    # progress_map(parse_genome, input_path)
-
-    # input_path = [
-    #     (path, Path("/data/pgap/parsed_genomes/alteromonadales/"))
-    #     for path in Path("/data/pgap/input_genomes/alteromonadales/").iterdir()
-    # ]
-    # progress_map(parse_genome, input_path)
-
-    pgap_inputs = get_pgap_inputs(
-        Path("/data/pgap/parsed_genomes/thermococcales"),
-        Path(__file__).parents[2] / Path("input_data/thermococcales.tsv"),
-    )
-    pgap_inputs = [
-        (
-            genome_path,
-            strain,
-            org_name,
-            Path(f"/data/pgap/proteomes/thermococcales/{genome_path.stem}"),
+    # Genomes are cleaned beforehand with `data-assembly clean`.
+    from data_assembly.scheduler import PgapJob, PgapScheduler
+
+    logging.basicConfig(level=logging.INFO)
+    for order in ["thermococcales", "alteromonadales"]:
+        pgap_inputs = get_pgap_inputs(
+            Path(f"/data/pgap/parsed_genomes/{order}"),
+            Path(__file__).parents[2] / Path(f"input_data/{order}.tsv"),
         )
-        for (genome_path, strain, org_name) in pgap_inputs
-    ]
-    progress_map(create_imput_and_run_pgap, pgap_inputs, n_cpu=8)
-
-    pgap_inputs = get_pgap_inputs(
-        Path("/data/pgap/parsed_genomes/alteromonadales"),
-        Path(__file__).parents[2] / Path("input_data/alteromonadales.tsv"),
-    )
-    pgap_inputs = [
-        (
-            genome_path,
-            strain,
-            org_name,
-            Path(f"/data/pgap/proteomes/alteromonadales/{genome_path.stem}"),
+        PgapScheduler().run(
+            [
+                PgapJob(
+                    genome_path,
+                    strain,
+                    org_name,
+                    Path(f"/data/pgap/proteomes/{order}/{genome_path.stem}"),
+                )
+                for (genome_path, strain, org_name) in pgap_inputs
+            ]
         )
-        for (genome_path, strain, org_name) in pgap_inputs
-    ]
-    progress_map(create_imput_and_run_pgap, pgap_inputs, n_cpu=8)
@@ -0,0 +1,231 @@
+"""Timing and profiling of the stages of the pipeline.
+
+Stages are timed with `timed`, as a context manager or a decorator, and each
+timing is kept as a `TimingEvent` of the process. Worker processes return
+their events with their results, see `drain_events`, so that the parent can
+export the timings of the whole run with `export_timings`. Timings are only
+recorded once enabled with `enable_timings` or by setting the
+`DATA_ASSEMBLY_TIMINGS` environment variable, `timed` doing nothing otherwise.
+
+Setting the `DATA_ASSEMBLY_PROFILE` environment variable to `cprofile`,
+`tracemalloc` or both separated by a comma makes `profiling` capture a
+profile of the code it wraps in `DATA_ASSEMBLY_PROFILE_DIR`.
+"""
+
+import contextlib
+import functools
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+PROFILE_ENV = "DATA_ASSEMBLY_PROFILE"
+PROFILE_DIR_ENV = "DATA_ASSEMBLY_PROFILE_DIR"
+PROFILE_DIR = Path(".profile")
+TIMINGS_ENV = "DATA_ASSEMBLY_TIMINGS"
+
+_enabled = bool(os.environ.get(TIMINGS_ENV))
+_events = []
+_events_lock = threading.Lock()
+
+
+def enable_timings(enabled: bool = True):
+    """Start or stop recording timings in this process.
+
+    The environment variable is set as well, so that worker processes started
+    afterwards record their timings too, whatever their start method.
+    """
+    global _enabled
+    _enabled = enabled
+    if enabled:
+        os.environ[TIMINGS_ENV] = "1"
+    else:
+        os.environ.pop(TIMINGS_ENV, None)
+
+
+def timings_enabled() -> bool:
+    """Tell if timings are recorded."""
+    return _enabled
+
+
+class TimingEvent(NamedTuple):
+    """A stage which ran in a thread of a process.
+
+    `start` is a wall clock time in seconds, comparable between processes.
+    """
+
+    name: str
+    start: float
+    duration: float
+    pid: int
+    tid: int
+    args: dict
+
+
+def record_event(name: str, start: float, duration: float, **args):
+    """Record a stage which ran from `start` for `duration` seconds, if enabled."""
+    if not _enabled:
+        return
+    event = TimingEvent(
+        name, start, duration, os.getpid(), threading.get_native_id(), args
+    )
+    with _events_lock:
+        _events.append(event)
+
+
+class Timer(contextlib.ContextDecorator):
+    """Record the time spent in a block of code or in each call of a function."""
+
+    def __init__(self, name: str, args: dict):
+        self.name: str = name
+        self.args: dict = args
+        self._start: float | None = None
+
+    def _recreate_cm(self):
+        # A decorated function may run in several threads at the same time.
+        return type(self)(self.name, self.args)
+
+    def __call__(self, func):
+        # Calls are not wrapped in a context manager while timings are disabled.
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with self._recreate_cm():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def __enter__(self):
+        if _enabled:
+            self._start = time.time()
+            self._perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._start is not None:
+            duration = time.perf_counter() - self._perf_start
+            record_event(self.name, self._start, duration, **self.args)
+            self._start = None
+        return False
+
+
+def timed(name: str, **args) -> Timer:
+    """Time a block of code or each call of a function as the stage `name`.
+
+    Keyword arguments are recorded with the timing, like the genome the stage
+    ran on. Nothing is timed unless timings are enabled, see `enable_timings`.
+    """
+    return Timer(name, args)
+
+
+def drain_events() -> list[TimingEvent]:
+    """Get and forget the events recorded by this process."""
+    with _events_lock:
+        events = list(_events)
+        _events.clear()
+    return events
+
+
+def add_events(events: Iterable[TimingEvent]):
+    """Add the events of another process to the events of this one."""
+    with _events_lock:
+        _events.extend(TimingEvent(*event) for event in events)
+
+
+def get_profile_modes() -> set[str]:
+    """Get the profilers enabled by the environment."""
+    modes = os.environ.get(PROFILE_ENV, "")
+    return {mode.strip() for mode in modes.split(",") if mode.strip()}
+
+
+@contextlib.contextmanager
+def profiling(name: str) -> Iterator[None]:
+    """Profile a block of code if enabled by the environment.
+
+    With `cprofile` the statistics are dumped in `<name>.<pid>.prof`, readable
+    with `pstats` or snakeviz. With `tracemalloc` the lines allocating the most
+    memory are written in `<name>.<pid>.tracemalloc.txt` and the peak of
+    traced memory is recorded as a timing event.
+    """
+    modes = get_profile_modes()
+    if not modes:
+        yield
+        return
+    # The profilers are only imported when enabled, to keep imports cheap.
+    import cProfile
+    import tracemalloc
+
+    profile_dir = Path(os.environ.get(PROFILE_DIR_ENV, PROFILE_DIR))
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"{name}.{os.getpid()}"
+    profiler = cProfile.Profile() if "cprofile" in modes else None
+    trace_memory = "tracemalloc" in modes and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    start, perf_start = time.time(), time.perf_counter()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_dir / Path(f"{stem}.prof"))
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with (profile_dir / Path(f"{stem}.tracemalloc.txt")).open("w+") as f:
+                f.write(f"Peak traced memory: {peak / 1e6:.1f} MB\n")
+                for stat in snapshot.statistics("lineno")[:25]:
+                    f.write(f"{stat}\n")
+            record_event(
+                f"{name}.memory",
+                start,
+                time.perf_counter() - perf_start,
+                peak_mb=peak / 1e6,
+            )
+
+
+def summarize(events: Iterable[TimingEvent]) -> dict[str, dict]:
+    """Sum up the timings of each stage."""
+    summary = {}
+    for event in events:
+        stage = summary.setdefault(event.name, {"count": 0, "total": 0.0, "max": 0.0})
+        stage["count"] += 1
+        stage["total"] += event.duration
+        stage["max"] = max(stage["max"], event.duration)
+    for stage in summary.values():
+        stage["mean"] = stage["total"] / stage["count"]
+    return summary
+
+
+def export_timings(events: list[TimingEvent], output_path: Path):
+    """Write the timings of a run in a JSON file.
+
+    The file holds the summary of each stage and every event in the Chrome
+    trace format, so that it also opens in chrome://tracing or Perfetto.
+    """
+    import json
+
+    origin = min((event.start for event in events), default=0.0)
+    trace = {
+        "summary": summarize(events),
+        "traceEvents": [
+            {
+                "name": event.name,
+                "ph": "X",
+                "ts": (event.start - origin) * 1e6,
+                "dur": event.duration * 1e6,
+                "pid": event.pid,
+                "tid": event.tid,
+                "args": event.args,
+            }
+            for event in events
+        ],
+        "displayTimeUnit": "ms",
+    }
+    with output_path.open("w+") as f:
+        json.dump(trace, f)
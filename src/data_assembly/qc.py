@@ -0,0 +1,141 @@
+"""Quality metrics of genome assemblies.
+
+Metrics are computed with byte level counting, `bytes.count` and `bytes.find`
+running in C over whole contigs, never with a loop over nucleotides. Genomes
+of a directory are measured in parallel to sort out assemblies before they
+are annotated.
+"""
+
+import bisect
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, NamedTuple, TextIO
+from data_assembly.fasta import Fasta, iter_fasta_records
+from data_assembly.sequence_store import SequenceStore
+
+# Lower bounds of the bins of the gap length histogram.
+GAP_BINS = (1, 10, 100, 1000, 10000)
+
+_N_RUN = re.compile(b"N+")
+
+
+class GenomeQC(NamedTuple):
+    """Quality metrics of a genome.
+
+    `gc` is the GC content of the A, C, G and T of the genome, soft masked
+    ones included, and `gaps` the number of runs of N in each of `GAP_BINS`.
+    """
+
+    genome: str
+    contigs: int
+    length: int
+    min_contig: int
+    max_contig: int
+    n50: int
+    l50: int
+    gc: float
+    n_fraction: float
+    gaps: tuple[int, ...]
+
+
+def get_n50(lengths: Iterable[int]) -> tuple[int, int]:
+    """Get the N50 and L50 of contig lengths.
+
+    The N50 is the length of the contig reaching half of the genome when
+    summing contigs from the longest, the L50 the number of contigs summed.
+    """
+    lengths = sorted(lengths, reverse=True)
+    half = sum(lengths) / 2
+    total = 0
+    for i, length in enumerate(lengths):
+        total += length
+        if total >= half:
+            return length, i + 1
+    return 0, 0
+
+
+def count_gaps(seq: bytes, gaps: list[int]) -> int:
+    """Count the runs of N of a sequence in the bins of `gaps`.
+
+    Return the number of N of the sequence.
+    """
+    n_count = 0
+    pos = 0
+    while (start := seq.find(b"N", pos)) != -1:
+        pos = _N_RUN.match(seq, start).end()
+        gaps[bisect.bisect_right(GAP_BINS, pos - start) - 1] += 1
+        n_count += pos - start
+    return n_count
+
+
+def sequences_qc(sequences: Iterable[str | bytes], genome: str = "") -> GenomeQC:
+    """Measure a genome from its sequences, read one at a time."""
+    lengths = []
+    gc = at = n_count = 0
+    gaps = [0] * len(GAP_BINS)
+    for seq in sequences:
+        if isinstance(seq, str):
+            seq = seq.encode("ascii")
+        lengths.append(len(seq))
+        gc += sum(seq.count(base) for base in (b"G", b"C", b"g", b"c"))
+        at += sum(seq.count(base) for base in (b"A", b"T", b"a", b"t"))
+        n_count += count_gaps(seq.upper() if b"n" in seq else seq, gaps)
+    length = sum(lengths)
+    n50, l50 = get_n50(lengths)
+    return GenomeQC(
+        genome,
+        len(lengths),
+        length,
+        min(lengths, default=0),
+        max(lengths, default=0),
+        n50,
+        l50,
+        gc / (gc + at) if gc + at else 0.0,
+        n_count / length if length else 0.0,
+        tuple(gaps),
+    )
+
+
+def fasta_qc(fasta: Fasta) -> GenomeQC:
+    """Measure the genome of a `Fasta`."""
+    if isinstance(fasta.sequences, SequenceStore):
+        sequences = (
+            bytes(fasta.sequences.view(i)) for i in range(len(fasta.sequences))
+        )
+    else:
+        sequences = fasta.sequences
+    return sequences_qc(sequences, fasta.stem or "")
+
+
+def genome_file_qc(genome_path: Path) -> GenomeQC:
+    """Measure a genome file, holding one sequence at a time in memory."""
+    return sequences_qc(
+        (seq for _, seq in iter_fasta_records(genome_path)), genome_path.stem
+    )
+
+
+def genomes_qc(genome_paths: list[Path], jobs: int | None = None) -> list[GenomeQC]:
+    """Measure genome files in `jobs` processes, in the order of `genome_paths`."""
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(genome_file_qc, genome_paths))
+
+
+def get_qc_header() -> list[str]:
+    """Get the columns of a table of metrics."""
+    gap_columns = [
+        f"gaps_{low}_{high - 1}" for low, high in zip(GAP_BINS, GAP_BINS[1:])
+    ]
+    gap_columns.append(f"gaps_{GAP_BINS[-1]}_more")
+    return [*GenomeQC._fields[:-1], *gap_columns]
+
+
+def write_qc_table(results: Iterable[GenomeQC], f: TextIO):
+    """Write the metrics of genomes as a tsv table with a header."""
+    f.write("\t".join(get_qc_header()) + "\n")
+    for qc in results:
+        values = [
+            f"{value:.4f}" if isinstance(value, float) else str(value)
+            for value in qc[:-1]
+        ]
+        f.write("\t".join([*values, *map(str, qc.gaps)]) + "\n")
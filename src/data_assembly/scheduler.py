@@ -0,0 +1,549 @@
+"""Run PGAP on many genomes within CPU and memory budgets."""
+
+import asyncio
+import collections
+import logging
+import math
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Iterable, NamedTuple
+from data_assembly.cache import Cache
+from data_assembly.compression import is_gzip
+from data_assembly.config import CACHE_DIR, PGAP_EXECUTABLE
+from data_assembly.dedup import group_identical, link_dir
+from data_assembly.fasta import fingerprint_fasta
+from data_assembly.fasta_index import build_fai
+from data_assembly.profiling import record_event
+from data_assembly.pgap import (
+    INPUT_YAML,
+    create_input_pgap,
+    get_pgap_cache_key,
+    get_pgap_command,
+    remove_input_pgap,
+)
+
+logger = logging.getLogger(__name__)
+
+# Longest line of output of PGAP read at once.
+STREAM_LIMIT = 1 << 20
+
+
+class PgapJob(NamedTuple):
+    """A genome to annotate with PGAP."""
+
+    genome_path: Path
+    strain: str
+    genus_species: str
+    output_path: Path
+
+
+class JobCost(NamedTuple):
+    """Resources needed by a PGAP run."""
+
+    cpus: int
+    memory_gb: int
+
+
+class JobResult(NamedTuple):
+    """Outcome of a PGAP run.
+
+    `returncode` is None when the run was skipped because the cache holds it.
+    `duplicate_of` is the genome annotated in place of the genome of the job
+    when they are identical, see `PgapScheduler`.
+    """
+
+    job: PgapJob
+    cost: JobCost
+    returncode: int | None
+    wall_time: float
+    attempts: int = 1
+    duplicate_of: Path | None = None
+
+
+def estimate_genome_length(genome_path: Path) -> int:
+    """Get the number of nucleotides of a genome.
+
+    The length is estimated from the size of the file when the genome is
+    compressed or cannot be indexed, like when its lines are irregular.
+    """
+    if is_gzip(genome_path):
+        # Nucleotides compress about 4 times with gzip.
+        return 4 * genome_path.stat().st_size
+    try:
+        return sum(record.length for record in build_fai(genome_path))
+    except ValueError as error:
+        logger.warning(f"Genome length estimated from the file size: {error}")
+        return genome_path.stat().st_size
+
+
+def estimate_pgap_cost(
+    genome_len: int,
+    base_memory_gb: int = 8,
+    memory_gb_per_mb: float = 2.0,
+    mb_per_cpu: float = 1.0,
+    max_cpus: int = 8,
+) -> JobCost:
+    """Estimate the resources PGAP needs to annotate a genome.
+
+    Memory grows linearly with the genome length from a fixed base, and a CPU
+    is given for every `mb_per_cpu` megabases up to `max_cpus`.
+    """
+    genome_mb = genome_len / 1e6
+    cpus = min(max_cpus, max(1, math.ceil(genome_mb / mb_per_cpu)))
+    memory_gb = math.ceil(base_memory_gb + memory_gb_per_mb * genome_mb)
+    return JobCost(cpus, memory_gb)
+
+
+def get_cleaned_fingerprints(genome_dirs: Iterable[Path]) -> dict[Path, str]:
+    """Get the fingerprints of the genomes cleaned in directories.
+
+    The fingerprints are computed while genomes are cleaned and kept in their
+    cleaning report, recorded in the cache of the directory. A genome changed
+    since it was recorded is left out. Return the fingerprint of each genome
+    file, by resolved path.
+    """
+    fingerprints = {}
+    times = {}
+    for genome_dir in genome_dirs:
+        for record in Cache(genome_dir / CACHE_DIR).records():
+            genome_hash = record.get("report", {}).get("genome_hash")
+            if not genome_hash or not record.get("outputs"):
+                continue
+            output_path = Path(record["outputs"][0]).resolve()
+            try:
+                modified = output_path.stat().st_mtime
+            except OSError:
+                continue
+            # The latest record of a genome cleaned again wins.
+            if modified <= record["time"] and record["time"] > times.get(
+                output_path, 0.0
+            ):
+                fingerprints[output_path] = genome_hash
+                times[output_path] = record["time"]
+    return fingerprints
+
+
+def get_total_memory_gb() -> int:
+    """Get the physical memory of the machine."""
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**30
+
+
+class PgapScheduler:
+    """Run PGAP jobs side by side within CPU and memory budgets.
+
+    Jobs are started from the most expensive to the cheapest. When the next
+    job does not fit in what is left of the budgets, cheaper jobs which do
+    fit are started in its place. A job larger than the budgets runs alone,
+    with the whole budgets. The inputs of each job are created in its own
+    directory of `scratch_dir`, removed once the job is done. Identical
+    genomes of the same organism and strain are annotated once, the output
+    directory of the others being a link to the annotation.
+    """
+
+    def __init__(
+        self,
+        cpus: int | None = None,
+        memory_gb: int | None = None,
+        pgap_executable: Path = PGAP_EXECUTABLE,
+        poll_interval: float = 5.0,
+        estimate_cost=estimate_pgap_cost,
+        scratch_dir: Path | None = None,
+    ):
+        self.cpus: int = cpus or os.cpu_count()
+        self.memory_gb: int = memory_gb or get_total_memory_gb()
+        self.pgap_executable: Path = pgap_executable
+        self.poll_interval: float = poll_interval
+        self.estimate_cost = estimate_cost
+        self.scratch_dir: Path | None = scratch_dir
+
+    def get_cost(self, job: PgapJob) -> JobCost:
+        """Get the resources given to a job, capped to the budgets."""
+        cost = self.estimate_cost(estimate_genome_length(job.genome_path))
+        return JobCost(min(cost.cpus, self.cpus), min(cost.memory_gb, self.memory_gb))
+
+    def _start(self, job: PgapJob, cost: JobCost) -> tuple[subprocess.Popen, Path]:
+        """Create the inputs of a job and start PGAP.
+
+        Return the PGAP process and the directory of its inputs.
+        """
+        input_dir = create_input_pgap(
+            job.genome_path, job.genus_species, job.strain, self.scratch_dir
+        )
+        try:
+            cmd = get_pgap_command(
+                job.output_path,
+                input_dir / Path(INPUT_YAML),
+                cost.cpus,
+                cost.memory_gb,
+                self.pgap_executable,
+            )
+            logger.debug(f"Start PGAP on {job.genome_path.stem}: {' '.join(cmd)}")
+            return subprocess.Popen(cmd), input_dir
+        except BaseException:
+            remove_input_pgap(input_dir)
+            raise
+
+    def _group_identical(self, jobs: list[PgapJob]) -> dict[PgapJob, list[PgapJob]]:
+        """Group the jobs of identical genomes of the same organism and strain.
+
+        Genomes are compared through the fingerprint of their sequences, taken
+        from their cleaning report, see `get_cleaned_fingerprints`, or computed
+        from the file when there is none. A genome which cannot be read is
+        kept apart. Return the job to run for each group with the other jobs
+        of the group. The organism and strain are written in the submol of the
+        annotation, so genomes which differ by them are annotated apart.
+        """
+        fingerprints = get_cleaned_fingerprints(
+            {job.genome_path.parent for job in jobs}
+        )
+
+        def get_key(job: PgapJob) -> tuple:
+            genome_hash = fingerprints.get(job.genome_path.resolve())
+            if genome_hash is None:
+                try:
+                    genome_hash = fingerprint_fasta(job.genome_path).genome
+                except (OSError, ValueError) as error:
+                    logger.warning(
+                        f"Could not fingerprint {job.genome_path}, it is not "
+                        f"compared to the other genomes: {error!r}"
+                    )
+                    return job, None
+            return genome_hash, job.genus_species, job.strain
+
+        return group_identical(jobs, get_key)
+
+    def _link_duplicates(
+        self, result: JobResult, duplicates: list[PgapJob]
+    ) -> list[JobResult]:
+        """Link the annotation of a job to the output paths of its duplicates.
+
+        Return the results of the duplicates, failed when the job failed.
+        """
+        results = []
+        for job in duplicates:
+            if not result.returncode and not link_dir(
+                result.job.output_path, job.output_path
+            ):
+                logger.warning(
+                    f"{job.output_path} already exists and is not replaced by the "
+                    f"annotation of {result.job.genome_path.stem}."
+                )
+            results.append(
+                JobResult(
+                    job,
+                    JobCost(0, 0),
+                    result.returncode,
+                    0.0,
+                    result.attempts,
+                    result.job.genome_path,
+                )
+            )
+        return results
+
+    def _get_pending(
+        self, jobs: list[PgapJob]
+    ) -> tuple[list[JobResult], list[tuple[JobCost, PgapJob, str]]]:
+        """Split jobs between the ones in the cache and the ones to run.
+
+        Return the results of the jobs in the cache and the cost, job and cache
+        key of the others, the most expensive first.
+        """
+        results = []
+        pending = []
+        for job in jobs:
+            cache = Cache(job.output_path.parent / CACHE_DIR)
+            key = get_pgap_cache_key(
+                job.genome_path, job.genus_species, job.strain, job.output_path
+            )
+            if cache.get(key) is not None:
+                logger.debug(f"PGAP already runned on the file {job.output_path.stem}.")
+                results.append(JobResult(job, JobCost(0, 0), None, 0.0))
+            else:
+                pending.append((self.get_cost(job), job, key))
+        pending.sort(key=lambda item: item[0], reverse=True)
+        return results, pending
+
+    def _record_run(
+        self, job: PgapJob, cost: JobCost, key: str, returncode: int, wall_time: float
+    ):
+        """Log the end of a PGAP run and record it in the cache if it succeeded."""
+        record_event(
+            "pgap",
+            time.time() - wall_time,
+            wall_time,
+            genome=job.genome_path.stem,
+            cpus=cost.cpus,
+            memory_gb=cost.memory_gb,
+            returncode=returncode,
+        )
+        if returncode:
+            logger.warning(
+                f"PGAP runned on the file {job.output_path.stem} "
+                f"but did not success ({returncode})."
+            )
+        else:
+            logger.debug(
+                f"PGAP runned on the file {job.output_path.stem} "
+                f"and success in {wall_time:.0f} s."
+            )
+            Cache(job.output_path.parent / CACHE_DIR).record(
+                key,
+                [job.output_path],
+                genome=str(job.genome_path),
+                wall_time=wall_time,
+            )
+
+    def run(self, jobs: list[PgapJob]) -> list[JobResult]:
+        """Run every job and return their results in order of completion."""
+        duplicates = self._group_identical(jobs)
+        results, pending = self._get_pending(list(duplicates))
+        running = []
+        free_cpus, free_memory_gb = self.cpus, self.memory_gb
+        try:
+            while pending or running:
+                for item in list(pending):
+                    cost, job, key = item
+                    if cost.cpus <= free_cpus and cost.memory_gb <= free_memory_gb:
+                        pending.remove(item)
+                        try:
+                            process, input_dir = self._start(job, cost)
+                        except Exception:
+                            logger.exception(
+                                f"Could not start PGAP on the file {job.genome_path}."
+                            )
+                            results.append(JobResult(job, cost, -1, 0.0))
+                            continue
+                        running.append(
+                            (process, input_dir, time.perf_counter(), cost, job, key)
+                        )
+                        free_cpus -= cost.cpus
+                        free_memory_gb -= cost.memory_gb
+
+                done = [item for item in running if item[0].poll() is not None]
+                if running and not done:
+                    time.sleep(self.poll_interval)
+                    continue
+                for item in done:
+                    running.remove(item)
+                    process, input_dir, start, cost, job, key = item
+                    wall_time = time.perf_counter() - start
+                    free_cpus += cost.cpus
+                    free_memory_gb += cost.memory_gb
+                    remove_input_pgap(input_dir)
+                    self._record_run(job, cost, key, process.returncode, wall_time)
+                    results.append(JobResult(job, cost, process.returncode, wall_time))
+        finally:
+            # Interrupted: stop the runs left so that no input is left behind.
+            for process, input_dir, *_ in running:
+                process.kill()
+                process.wait()
+                remove_input_pgap(input_dir)
+        for result in list(results):
+            results += self._link_duplicates(result, duplicates[result.job])
+        return results
+
+
+class AsyncPgapScheduler(PgapScheduler):
+    """Run PGAP jobs within CPU and memory budgets from a single event loop.
+
+    Each PGAP process is watched by a coroutine instead of a blocked process
+    or thread. Its output is written in the log of its genome,
+    `<output_path>.log`, or in `log_dir` when given, and its last lines are
+    logged when it fails. A run longer than `timeout` seconds is killed. A
+    failed run is tried again up to `retries` times, after waiting `backoff`
+    seconds doubled at each new try. `on_result` is called with each result,
+    the number of jobs done and the number of jobs, to report progress.
+    """
+
+    def __init__(
+        self,
+        cpus: int | None = None,
+        memory_gb: int | None = None,
+        pgap_executable: Path = PGAP_EXECUTABLE,
+        estimate_cost=estimate_pgap_cost,
+        scratch_dir: Path | None = None,
+        timeout: float | None = None,
+        retries: int = 0,
+        backoff: float = 60.0,
+        log_dir: Path | None = None,
+        on_result=None,
+        tail_lines: int = 20,
+    ):
+        super().__init__(
+            cpus,
+            memory_gb,
+            pgap_executable,
+            estimate_cost=estimate_cost,
+            scratch_dir=scratch_dir,
+        )
+        self.timeout: float | None = timeout
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.log_dir: Path | None = log_dir
+        self.on_result = on_result
+        self.tail_lines: int = tail_lines
+
+    def get_log_path(self, job: PgapJob) -> Path:
+        """Get the file the output of the PGAP runs of a job is written in."""
+        if self.log_dir is not None:
+            return self.log_dir / Path(f"{job.output_path.name}.log")
+        return job.output_path.parent / Path(f"{job.output_path.name}.log")
+
+    def run(self, jobs: list[PgapJob]) -> list[JobResult]:
+        """Run every job and return their results in order of completion."""
+        return asyncio.run(self.run_async(jobs))
+
+    async def run_async(self, jobs: list[PgapJob]) -> list[JobResult]:
+        """Run every job and return their results in order of completion.
+
+        Cancelling the coroutine kills the running PGAP processes and removes
+        their inputs.
+        """
+        # Genomes without a cleaning report are read, out of the event loop.
+        duplicates = await asyncio.to_thread(self._group_identical, jobs)
+        cached, pending = self._get_pending(list(duplicates))
+        results = []
+        n_jobs = len(jobs)
+        for result in cached:
+            self._report(result, duplicates, results, n_jobs)
+        self._free = JobCost(self.cpus, self.memory_gb)
+        self._budget = asyncio.Condition()
+        # Jobs wait for their budget in order, the most expensive first, and
+        # cheaper jobs start in the budget left while a bigger one waits.
+        tasks = [
+            asyncio.create_task(self._run_job(job, cost, key))
+            for cost, job, key in pending
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                self._report(await task, duplicates, results, n_jobs)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return results
+
+    def _report(
+        self,
+        result: JobResult,
+        duplicates: dict[PgapJob, list[PgapJob]],
+        results: list[JobResult],
+        n_jobs: int,
+    ):
+        """Add a result and the ones of its duplicates and report the progress."""
+        linked = self._link_duplicates(result, duplicates[result.job])
+        for new_result in [result, *linked]:
+            results.append(new_result)
+            if self.on_result is not None:
+                self.on_result(new_result, len(results), n_jobs)
+
+    async def _reserve(self, cost: JobCost):
+        """Wait until the budgets left fit `cost` and take it from them."""
+        async with self._budget:
+            await self._budget.wait_for(
+                lambda: (
+                    cost.cpus <= self._free.cpus
+                    and cost.memory_gb <= self._free.memory_gb
+                )
+            )
+            self._free = JobCost(
+                self._free.cpus - cost.cpus, self._free.memory_gb - cost.memory_gb
+            )
+
+    async def _release(self, cost: JobCost):
+        """Give `cost` back to the budgets."""
+        async with self._budget:
+            self._free = JobCost(
+                self._free.cpus + cost.cpus, self._free.memory_gb + cost.memory_gb
+            )
+            self._budget.notify_all()
+
+    async def _run_job(self, job: PgapJob, cost: JobCost, key: str) -> JobResult:
+        """Run a job, trying again after a failure, and record its result."""
+        log_path = self.get_log_path(job)
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        for attempt in range(1, self.retries + 2):
+            if attempt > 1:
+                delay = self.backoff * 2 ** (attempt - 2)
+                logger.info(
+                    f"Try PGAP again on {job.genome_path.stem} in {delay:.0f} s "
+                    f"(attempt {attempt})."
+                )
+                await asyncio.sleep(delay)
+            await self._reserve(cost)
+            start = time.perf_counter()
+            try:
+                returncode = await self._run_once(job, cost, log_path, attempt)
+            finally:
+                await self._release(cost)
+            wall_time = time.perf_counter() - start
+            if not returncode:
+                break
+        self._record_run(job, cost, key, returncode, wall_time)
+        return JobResult(job, cost, returncode, wall_time, attempt)
+
+    async def _run_once(
+        self, job: PgapJob, cost: JobCost, log_path: Path, attempt: int
+    ) -> int:
+        """Run PGAP once on a job and return its exit status."""
+        try:
+            input_dir = create_input_pgap(
+                job.genome_path, job.genus_species, job.strain, self.scratch_dir
+            )
+        except Exception:
+            logger.exception(f"Could not start PGAP on the file {job.genome_path}.")
+            return -1
+        try:
+            cmd = get_pgap_command(
+                job.output_path,
+                input_dir / Path(INPUT_YAML),
+                cost.cpus,
+                cost.memory_gb,
+                self.pgap_executable,
+            )
+            with log_path.open("ab") as log:
+                log.write(f"# Attempt {attempt}: {' '.join(cmd)}\n".encode())
+                log.flush()
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    limit=STREAM_LIMIT,
+                )
+                tail = collections.deque(maxlen=self.tail_lines)
+                try:
+                    await asyncio.wait_for(
+                        self._watch(process, log, tail), self.timeout
+                    )
+                except TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    log.write(f"# Killed after {self.timeout} s\n".encode())
+                    logger.warning(
+                        f"PGAP on {job.genome_path.stem} killed after {self.timeout} s."
+                    )
+                except BaseException:
+                    process.kill()
+                    await process.wait()
+                    raise
+            if process.returncode:
+                logger.warning(
+                    f"PGAP failed on {job.genome_path.stem} ({process.returncode}), "
+                    f"end of {log_path}:\n" + b"".join(tail).decode(errors="replace")
+                )
+            return process.returncode
+        finally:
+            remove_input_pgap(input_dir)
+
+    async def _watch(
+        self, process: asyncio.subprocess.Process, log, tail: collections.deque
+    ):
+        """Copy the output of a process in its log until it exits."""
+        while line := await process.stdout.readline():
+            log.write(line)
+            log.flush()
+            tail.append(line)
+        await process.wait()
@@ -0,0 +1,190 @@
+"""Compact storage for the sequences of a fasta file."""
+
+import functools
+import re
+from typing import Iterable, Iterator, Self
+from data_assembly.config import N_RUN_LIMIT
+
+_NOT_ACGT_RUN = re.compile(rb"([^ACGT])\1*")
+_N_RUN = re.compile(rb"N*")
+_N_RUN_AT_END = re.compile(rb"N++\Z")
+
+
+@functools.cache
+def _pack_tables() -> list[bytes]:
+    """Get the translate tables packing bases, built on first use.
+
+    Map A, C, G, T to their 2 bits code shifted to their place in a byte, for
+    each of the 4 bases of the byte. Every other byte is stored as A and
+    restored from the exceptions of the packed sequence.
+    """
+    return [
+        bytes(max(b"ACGT".find(i), 0) << shift for i in range(256))
+        for shift in (6, 4, 2, 0)
+    ]
+
+
+@functools.cache
+def _unpack_table() -> list[bytes]:
+    """Get the 4 bases of each packed byte, built on first use."""
+    return [
+        bytes(b"ACGT"[(byte >> shift) & 3] for shift in (6, 4, 2, 0))
+        for byte in range(256)
+    ]
+
+
+class PackedSequence:
+    """A nucleotide sequence packed on 2 bits per base.
+
+    Only A, C, G and T fit on 2 bits. Every other character (N, IUPAC codes,
+    lowercase bases) is kept in a side table of runs of the same character,
+    which stays small for assemblies where N only appear in scaffold gaps.
+    """
+
+    __slots__ = ("packed", "length", "exceptions")
+
+    def __init__(
+        self, packed: bytes, length: int, exceptions: list[tuple[int, int, int]]
+    ):
+        self.packed: bytes = packed
+        self.length: int = length
+        self.exceptions: list[tuple[int, int, int]] = exceptions
+
+    @classmethod
+    def from_bytes(cls, seq: bytes | memoryview) -> Self:
+        """Pack a sequence."""
+        exceptions = [
+            (match.start(), match.end() - match.start(), seq[match.start()])
+            for match in _NOT_ACGT_RUN.finditer(seq)
+        ]
+        length = len(seq)
+        seq = bytes(seq) + b"A" * (-length % 4)
+        # The codes of the 4 bases of a byte take their own bits, so bytes are
+        # assembled at once by OR of the codes of each base read as integers.
+        packed = 0
+        for offset, table in enumerate(_pack_tables()):
+            packed |= int.from_bytes(seq[offset::4].translate(table), "big")
+        return cls(packed.to_bytes(len(seq) // 4, "big"), length, exceptions)
+
+    def to_bytes(self) -> bytes:
+        """Unpack the sequence."""
+        seq = bytearray(b"".join(map(_unpack_table().__getitem__, self.packed)))
+        del seq[self.length :]
+        for start, length, char in self.exceptions:
+            seq[start : start + length] = bytes((char,)) * length
+        return bytes(seq)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __str__(self) -> str:
+        return self.to_bytes().decode("ascii")
+
+
+class SequenceStore:
+    """Sequences stored back to back in a single buffer.
+
+    Each sequence is a (start, end) span of the buffer. Trimming or filtering
+    sequences only changes the spans and returns a new store sharing the same
+    buffer, the nucleotides are never copied. Sequences are read as `str` like
+    a list of sequences, or without copy with `view`.
+    """
+
+    def __init__(self, buffer: bytes | bytearray, spans: list[tuple[int, int]]):
+        self.buffer: bytes | bytearray = buffer
+        self.spans: list[tuple[int, int]] = spans
+
+    @classmethod
+    def from_sequences(cls, sequences: Iterable[str | bytes]) -> Self:
+        """Copy sequences in a new store."""
+        store = cls(bytearray(), [])
+        for seq in sequences:
+            store.append(seq)
+        return store
+
+    def append(self, seq: str | bytes):
+        """Copy a sequence at the end of the buffer."""
+        if isinstance(seq, str):
+            seq = seq.encode("ascii")
+        self.spans.append((len(self.buffer), len(self.buffer) + len(seq)))
+        self.buffer += seq
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __getitem__(self, index: int) -> str:
+        start, end = self.spans[index]
+        return self.buffer[start:end].decode("ascii")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self.spans)):
+            yield self[i]
+
+    def view(self, index: int) -> memoryview:
+        """Get a sequence as a view on the buffer."""
+        start, end = self.spans[index]
+        return memoryview(self.buffer)[start:end]
+
+    @property
+    def lengths(self) -> list[int]:
+        """Get the length of each sequence."""
+        return [end - start for start, end in self.spans]
+
+    def select(self, indices: Iterable[int]) -> Self:
+        """Keep only the sequences at `indices`."""
+        return type(self)(self.buffer, [self.spans[i] for i in indices])
+
+    def strip_n(self) -> Self:
+        """Remove first and last N of each sequence.
+
+        The runs of N are found in the buffer itself, only the spans change.
+        """
+        spans = []
+        for start, end in self.spans:
+            start = _N_RUN.match(self.buffer, start, end).end()
+            if start < end:
+                end = self._end_before_n_run(start, end)
+            spans.append((start, end))
+        return type(self)(self.buffer, spans)
+
+    def _end_before_n_run(self, start: int, end: int) -> int:
+        """Get the end of the span without its last run of N.
+
+        The run is searched in windows growing back from `end`, so that only
+        the run is scanned and not the whole sequence. The span must not start
+        with N.
+        """
+        size = 64
+        while True:
+            window_start = max(start, end - size)
+            match = _N_RUN_AT_END.search(self.buffer, window_start, end)
+            if match is None:
+                return end
+            if match.start() > window_start or window_start == start:
+                return match.start()
+            size *= 2
+
+    def collapse_n_runs(self, limit: int = N_RUN_LIMIT) -> Self:
+        """Keep at most `limit` successive N in each run of N.
+
+        The buffer is only rewritten when a sequence has a run to collapse.
+        """
+        # Imported here, the fasta module importing this one.
+        from data_assembly.fasta import _n_run_pattern
+
+        pattern = _n_run_pattern(limit, as_bytes=True)
+        if not any(
+            pattern.search(self.buffer, start, end) for start, end in self.spans
+        ):
+            return self
+        return type(self).from_sequences(
+            pattern.sub(b"N" * limit, self.view(i)) for i in range(len(self))
+        )
+
+    def compact(self) -> Self:
+        """Copy the sequences in a new buffer holding only them."""
+        return type(self).from_sequences(self.view(i) for i in range(len(self)))
+
+    def pack(self) -> list[PackedSequence]:
+        """Pack each sequence on 2 bits per base."""
+        return [PackedSequence.from_bytes(self.view(i)) for i in range(len(self))]
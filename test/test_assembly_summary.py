@@ -0,0 +1,124 @@
+"""Test the assembly summary utilities."""
+
+from pathlib import Path
+from data_assembly.assembly_summary import (
+    AssemblySummary,
+    filter_assembly_summary,
+    get_column_from_tsv,
+    get_genome_accession,
+    iter_assembly_summary,
+    scan_genome_dir,
+)
+from data_assembly.pgap import get_pgap_inputs
+import pytest
+
+HEADER = "#assembly_accession\tpaired_asm_comp\torganism_name\tinfraspecific_name\n"
+
+
+def write_summary(tsv_path: Path, rows: list[list[str]]):
+    """Write a small assembly summary with the columns used by pgap."""
+    with tsv_path.open("w") as f:
+        header = ["id", "accession", "paired", "organism", "", "", "", "strain"]
+        f.write("\t".join(header) + "\n")
+        for row in rows:
+            f.write("\t".join(row) + "\n")
+
+
+def test_assembly_summary(tmp_path: Path):
+    """Check the columns and the accession index of an assembly summary."""
+    tsv_path = tmp_path / Path("summary.tsv")
+    tsv_path.write_text(
+        HEADER + "GCF_1.1\tGCA_1.1\tPyrococcus\tA\nGCA_2.1\t\tThermococcus\n"
+    )
+    summary = AssemblySummary.from_tsv(tsv_path, accession_column=0)
+    assert len(summary) == 2
+    assert summary.column("organism_name") == ["Pyrococcus", "Thermococcus"]
+    assert summary.column(3) == ["A", ""]
+    assert "GCA_2.1" in summary and "GCA_1.1" not in summary
+    assert summary.row("GCF_1.1") == ["GCF_1.1", "GCA_1.1", "Pyrococcus", "A"]
+
+
+def test_scan_genome_dir(tmp_path: Path):
+    """Check that genome files are mapped to their accession."""
+    for name in ["GCR_1.1_ASM1v1.fna", "GCR_2.1.fna", "GCR_2.1.fna.fai", ".hidden"]:
+        (tmp_path / Path(name)).write_text("")
+    assert get_genome_accession(Path("GCR_1.1_ASM1v1.fna.gz")) == "GCR_1.1"
+    assert scan_genome_dir(tmp_path) == {
+        "GCR_1.1": tmp_path / Path("GCR_1.1_ASM1v1.fna"),
+        "GCR_2.1": tmp_path / Path("GCR_2.1.fna"),
+    }
+
+
+def test_get_pgap_inputs(tmp_path: Path):
+    """Check that rows are joined to their genome, each genome once."""
+    genome_dir = tmp_path / Path("genomes")
+    genome_dir.mkdir()
+    (genome_dir / Path("GCR_1.1.fna")).write_text("")
+    tsv_path = tmp_path / Path("summary.tsv")
+    write_summary(
+        tsv_path,
+        [
+            ["0", "GCF_1.1", "", "Pyrococcus", "", "", "", "A"],
+            ["1", "GCA_1.1", "", "Pyrococcus", "", "", "", "A"],
+            ["2", "GCF_3.1", "", "Thermococcus", "", "", "", "B"],
+        ],
+    )
+    assert get_pgap_inputs(genome_dir, tsv_path) == [
+        (genome_dir / Path("GCR_1.1.fna"), "A", "Pyrococcus")
+    ]
+
+
+def test_iter_assembly_summary(tmp_path: Path):
+    """Check the projection and filtering of a summary with NCBI comments."""
+    tsv_path = tmp_path / Path("assembly_summary_refseq.txt")
+    tsv_path.write_text(
+        "##  See ftp://ftp.ncbi.nlm.nih.gov/genomes/README_assembly_summary.txt\n"
+        + HEADER
+        + "GCF_1.1\tGCA_1.1\tPyrococcus\tA\nGCF_2.1\tGCA_2.1\tThermococcus\tB\n"
+    )
+    rows = iter_assembly_summary(
+        tsv_path,
+        ["infraspecific_name", 0],
+        lambda row: row[2].startswith("Thermo"),
+    )
+    assert list(rows) == [["B", "GCF_2.1"]]
+    assert get_column_from_tsv(tsv_path, 2) == ["Pyrococcus", "Thermococcus"]
+
+
+def test_filter_assembly_summary(tmp_path: Path):
+    """Check that a genome listed as GCA and GCF is kept once, as GCF."""
+    tsv_path = tmp_path / Path("summary.tsv")
+    write_summary(
+        tsv_path,
+        [
+            ["0", "GCA_1.1", "GCF_1.1", "Pyrococcus", "", "", "", "A"],
+            ["1", "GCF_1.1", "GCA_1.1", "Pyrococcus", "", "", "", "A"],
+            ["2", "GCF_2.1", "GCA_2.1", "Thermococcus", "", "", "", "B"],
+            ["3", "GCA_2.1", "GCF_2.1", "Thermococcus", "", "", "", "B"],
+            ["4", "GCA_3.1", "GCF_3.1", "Palaeococcus", "", "", "", "C"],
+            ["5", "GCA_4.1", "", "Thermococcus", "", "", "", "D"],
+        ],
+    )
+    output_path = tmp_path / Path("filtered.tsv")
+    assert filter_assembly_summary(tsv_path, output_path) == 4
+    assert get_column_from_tsv(output_path, "accession") == [
+        "GCF_1.1",
+        "GCF_2.1",
+        "GCA_3.1",
+        "GCA_4.1",
+    ]
+
+    cache_path = tmp_path / Path("filtered.pkl")
+    n_rows = filter_assembly_summary(
+        tsv_path,
+        cache_path,
+        columns=["strain", "accession"],
+        predicate=lambda row: row[3] == "Thermococcus",
+    )
+    assert n_rows == 2
+    summary = AssemblySummary.from_tsv(cache_path)
+    assert summary.header == ["strain", "accession"]
+    assert summary.row("GCA_4.1") == ["D", "GCA_4.1"]
+
+    with pytest.raises(ValueError):
+        filter_assembly_summary(tsv_path, output_path, columns=["strain"])
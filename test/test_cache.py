@@ -0,0 +1,58 @@
+"""Test the cache of completed jobs."""
+
+from pathlib import Path
+from data_assembly.cache import Cache, cache_key, hash_file
+from data_assembly.cli import main
+from data_assembly.fasta import Fasta
+
+
+def test_cache(tmp_path: Path):
+    """Check that a job is found in the cache only while its outputs exist."""
+    input_path = tmp_path / Path("input.txt")
+    input_path.write_text("input")
+    output_path = tmp_path / Path("output.txt")
+    output_path.write_text("output")
+    cache = Cache(tmp_path / Path(".cache"))
+    key = cache_key("job", hash_file(input_path), "param=1")
+    assert key != cache_key("job", hash_file(input_path), "param=2")
+    assert cache.get(key) is None
+
+    cache.record(key, [output_path], input=str(input_path))
+    assert cache.get(key)["outputs"] == [str(output_path)]
+    output_path.unlink()
+    assert cache.get(key) is None
+
+
+def test_clean_cached(tmp_path: Path, capsys):
+    """Check that a rerun of `clean` only cleans the changed genomes."""
+    in_dir = tmp_path / Path("genomes")
+    in_dir.mkdir()
+    out_dir = tmp_path / Path("parsed")
+    for i in range(2):
+        Fasta(["ACGT" * 5000], ["seq"]).to_fasta_file(in_dir / Path(f"GCF_{i}.1.fna"))
+    main(["clean", str(in_dir), str(out_dir), "--jobs", "1"])
+    capsys.readouterr()
+
+    Fasta(["ACGT" * 6000], ["seq"]).to_fasta_file(in_dir / Path("GCF_1.1.fna"))
+    main(["clean", str(in_dir), str(out_dir), "--jobs", "1"])
+    out = capsys.readouterr().out
+    assert "GCF_0.1.fna\tGCR_0.1.fna\tcached" in out
+    assert "GCF_1.1.fna\tGCR_1.1.fna\n" in out
+
+    main(["clean", str(in_dir), str(out_dir), "--jobs", "1", "--force"])
+    assert "cached" not in capsys.readouterr().out
+
+
+def test_clean_cached_same_content(tmp_path: Path, capsys):
+    """Check that genomes with the same content are cleaned under their names."""
+    in_dir = tmp_path / Path("genomes")
+    in_dir.mkdir()
+    out_dir = tmp_path / Path("parsed")
+    for i in range(2):
+        Fasta(["ACGT" * 5000], ["seq"]).to_fasta_file(in_dir / Path(f"GCF_{i}.1.fna"))
+    main(["clean", str(in_dir), str(out_dir), "--jobs", "1"])
+    out = capsys.readouterr().out
+    assert "cached" not in out
+    assert "GCF_0.1.fna\tGCR_0.1.fna" in out
+    assert "GCF_1.1.fna\tGCR_1.1.fna" in out
+    assert (out_dir / Path("GCR_1.1.fna")).exists()
@@ -0,0 +1,114 @@
+"""Test the command line interface."""
+
+import gzip
+import json
+from pathlib import Path
+from data_assembly.cli import list_genomes, main
+from data_assembly.compression import BGZF_EOF, is_gzip
+from data_assembly.fasta import Fasta
+import pytest
+
+
+def test_clean(tmp_path: Path, capsys):
+    """Check that `clean` writes the genomes in PGAP range and reports them."""
+    in_dir = tmp_path / Path("genomes")
+    in_dir.mkdir()
+    Fasta(["ACGT" * 5000], ["big"]).to_fasta_file(in_dir / Path("GCF_1.1_big.fna"))
+    Fasta(["ACGT" * 500], ["small"]).to_fasta_file(in_dir / Path("GCF_2.1_small.fna"))
+    (in_dir / Path("GCF_1.1_big.fna.fai")).write_text("")
+    assert [path.name for path in list_genomes(in_dir)] == [
+        "GCF_1.1_big.fna",
+        "GCF_2.1_small.fna",
+    ]
+
+    out_dir = tmp_path / Path("parsed")
+    assert main(["clean", str(in_dir), str(out_dir), "--jobs", "2"]) == 0
+    assert [path.name for path in list_genomes(out_dir)] == ["GCR_1.1_big.fna"]
+    captured = capsys.readouterr()
+    assert "GCF_1.1_big.fna\tGCR_1.1_big.fna" in captured.out
+    assert "GCF_2.1_small.fna\tout of PGAP range" in captured.out
+    assert "2 genomes in" in captured.err
+
+
+def test_clean_report(tmp_path: Path, capsys):
+    """Check that `clean` writes a report line for each genome."""
+    in_dir = tmp_path / Path("genomes")
+    in_dir.mkdir()
+    Fasta(["NN" + "ACGT" * 5000], ["big"]).to_fasta_file(in_dir / Path("GCF_1.1.fna"))
+    Fasta(["ACGT" * 500], ["small"]).to_fasta_file(in_dir / Path("GCF_2.1.fna"))
+    out_dir = tmp_path / Path("parsed")
+    for report_name in ["report.jsonl", "report.tsv"]:
+        report_path = tmp_path / Path(report_name)
+        main(["clean", str(in_dir), str(out_dir), "--report", str(report_path)])
+    reports = [
+        json.loads(line)
+        for line in (tmp_path / Path("report.jsonl")).read_text().splitlines()
+    ]
+    assert {report["genome"]: report["status"] for report in reports} == {
+        "GCF_1.1": "written",
+        "GCF_2.1": "too short",
+    }
+    lines = (tmp_path / Path("report.tsv")).read_text().splitlines()
+    assert lines[0].split("\t")[:2] == ["genome", "status"]
+    assert "GCF_1.1\twritten\t1\t0\t20002\t2\t0\t0\t20000" in lines
+
+
+def test_clean_chunked(tmp_path: Path, capsys):
+    """Check that genomes streamed by chunks are cleaned the same way."""
+    in_dir = tmp_path / Path("genomes")
+    in_dir.mkdir()
+    contig = "NN" + "ACGT" * 3000 + "N" * 100 + "ACGT" * 3000
+    Fasta([contig], ["seq"]).to_fasta_file(in_dir / Path("GCF_1.1.fna"))
+    for out_name, options in [("parsed", []), ("chunked", ["--chunk-size", "1"])]:
+        main(["clean", str(in_dir), str(tmp_path / Path(out_name)), *options])
+    assert (tmp_path / Path("chunked/GCR_1.1.fna")).read_bytes() == (
+        tmp_path / Path("parsed/GCR_1.1.fna")
+    ).read_bytes()
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--compress-level", "1"],
+        ["--bgzf"],
+        ["--bgzf", "--compress-level", "9", "--chunk-size", "1"],
+    ],
+)
+def test_clean_compressed(tmp_path: Path, capsys, options):
+    """Check that cleaned genomes are compressed with the given options."""
+    in_dir = tmp_path / Path("genomes")
+    in_dir.mkdir()
+    contig = "NN" + "ACGT" * 3000 + "N" * 100 + "ACGT" * 3000
+    Fasta([contig], ["seq"]).to_fasta_file(in_dir / Path("GCF_1.1.fna"))
+    main(["clean", str(in_dir), str(tmp_path / Path("parsed"))])
+    main(["clean", str(in_dir), str(tmp_path / Path("compressed")), *options])
+    output_path = tmp_path / Path("compressed/GCR_1.1.fna.gz")
+    assert is_gzip(output_path)
+    assert output_path.read_bytes().endswith(BGZF_EOF) == ("--bgzf" in options)
+    assert (
+        gzip.decompress(output_path.read_bytes())
+        == (tmp_path / Path("parsed/GCR_1.1.fna")).read_bytes()
+    )
+
+
+def test_clean_duplicates(tmp_path: Path, capsys):
+    """Check that identical genome files are cleaned once and linked."""
+    in_dir = tmp_path / Path("genomes")
+    in_dir.mkdir()
+    for name in ["GCA_1.1.fna", "GCF_1.1.fna"]:
+        Fasta(["ACGT" * 5000], ["seq"]).to_fasta_file(in_dir / Path(name))
+    Fasta(["ACGT" * 500], ["seq"]).to_fasta_file(in_dir / Path("GCF_2.1.fna"))
+    Fasta(["ACGT" * 500], ["seq"]).to_fasta_file(in_dir / Path("GCA_2.1.fna"))
+    out_dir = tmp_path / Path("parsed")
+    report_path = tmp_path / Path("report.jsonl")
+    args = ["clean", str(in_dir), str(out_dir), "--report", str(report_path)]
+    assert main(args) == 0
+    assert sorted(path.name for path in list_genomes(out_dir)) == ["GCR_1.1.fna"]
+    captured = capsys.readouterr()
+    assert "duplicate of" in captured.out
+    assert "2 duplicates" in captured.err
+    reports = [json.loads(line) for line in report_path.read_text().splitlines()]
+    assert len(reports) == 4
+    hashes = {report["genome_hash"] for report in reports if "genome_hash" in report}
+    assert len(hashes) == 1
+    assert sorted(report.get("duplicate_of", "") for report in reports)[:2] == ["", ""]
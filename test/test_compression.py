@@ -0,0 +1,43 @@
+"""Test the module reading and writing compressed files."""
+
+import gzip
+from pathlib import Path
+from data_assembly.compression import BGZF_EOF, is_gzip
+from data_assembly.fasta import Fasta
+import pytest
+
+
+@pytest.mark.parametrize(
+    "file_name, compresslevel, bgzf",
+    [
+        ("genome.fna.gz", None, False),
+        ("genome.fna", 1, False),
+        ("genome.fna.gz", 9, True),
+    ],
+)
+def test_compressed_fasta(tmp_path: Path, file_name, compresslevel, bgzf):
+    """Check that compressed fasta files are written and read back."""
+    fasta = Fasta(["ACGT" * 40000, "N" * 10 + "A" * 100], ["first", "second"])
+    output_path = tmp_path / Path(file_name)
+    fasta.to_fasta_file(output_path, compresslevel=compresslevel, bgzf=bgzf)
+    assert is_gzip(output_path)
+    parsed = Fasta.from_fasta_file(output_path)
+    assert parsed.sequences == fasta.sequences
+    assert parsed.titles == fasta.titles
+
+
+def test_bgzf_blocks(tmp_path: Path):
+    """Check that a BGZF file is made of blocks of at most 64 KiB."""
+    fasta = Fasta(["ACGT" * 100000], ["first"])
+    output_path = tmp_path / Path("genome.fna.gz")
+    fasta.to_fasta_file(output_path, bgzf=True)
+    data = output_path.read_bytes()
+    assert data.endswith(BGZF_EOF)
+    position = 0
+    while position < len(data):
+        assert data[position + 12 : position + 14] == b"BC"
+        block_size = int.from_bytes(data[position + 16 : position + 18], "little") + 1
+        assert block_size <= 65536
+        gzip.decompress(data[position : position + block_size])
+        position += block_size
+    assert position == len(data)
@@ -0,0 +1,118 @@
+"""Test the download of genomes with local stand-ins for NCBI."""
+
+import json
+import sys
+from pathlib import Path
+from data_assembly.data_getter import (
+    DatasetsBackend,
+    LocalDirectoryBackend,
+    download_genomes,
+)
+from data_assembly.fasta import Fasta
+
+FAKE_DATASETS = f"""#!{sys.executable}
+import sys, zipfile
+
+args = sys.argv[1:]
+accessions = args[3 : args.index("--include")]
+if "GCF_bad.1" in accessions:
+    raise SystemExit(1)
+with zipfile.ZipFile(args[args.index("--filename") + 1], "w") as archive:
+    for accession in accessions:
+        archive.writestr(f"ncbi_dataset/data/{{accession}}/genomic.fna", ">s\\nACGT\\n")
+"""
+
+
+def make_genomes(root: Path, accessions: list[str]):
+    for accession in accessions:
+        (root / Path(accession)).mkdir(parents=True)
+        (root / Path(f"{accession}/genomic.fna")).write_text(f">{accession}\nACGT\n")
+        (root / Path(f"{accession}/protein.faa")).write_text(">p\nMK\n")
+
+
+def test_local_directory_backend(tmp_path: Path):
+    """Check that every genome is extracted in its own directory."""
+    accessions = [f"GCF_{i}.1" for i in range(7)]
+    make_genomes(tmp_path / Path("ncbi"), accessions)
+    output_dir = tmp_path / Path("genomes")
+    downloaded = download_genomes(
+        accessions + ["GCF_missing.1"],
+        output_dir,
+        LocalDirectoryBackend(tmp_path / Path("ncbi")),
+        batch_size=3,
+        max_downloads=2,
+        scratch_dir=tmp_path,
+    )
+    assert downloaded == {**dict.fromkeys(accessions, True), "GCF_missing.1": False}
+    for accession in accessions:
+        assert sorted(path.name for path in (output_dir / accession).iterdir()) == [
+            "genomic.fna",
+            "protein.faa",
+        ]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["genomes", "ncbi"]
+
+
+def test_datasets_backend(tmp_path: Path):
+    """Check the download with a fake `datasets` binary."""
+    datasets = tmp_path / Path("datasets")
+    datasets.write_text(FAKE_DATASETS)
+    datasets.chmod(0o755)
+    output_dir = tmp_path / Path("genomes")
+    downloaded = download_genomes(
+        ["GCF_1.1", "GCF_2.1", "GCF_bad.1"],
+        output_dir,
+        DatasetsBackend(str(datasets)),
+        batch_size=2,
+    )
+    assert downloaded == {"GCF_1.1": True, "GCF_2.1": True, "GCF_bad.1": False}
+    assert (output_dir / Path("GCF_2.1/genomic.fna")).read_text() == ">s\nACGT\n"
+
+
+def test_clean_while_extracting(tmp_path: Path):
+    """Check that genomes are cleaned straight from the archive."""
+    ncbi_dir = tmp_path / Path("ncbi/GCF_1.1")
+    ncbi_dir.mkdir(parents=True)
+    (ncbi_dir / Path("GCF_1.1_asm_genomic.fna")).write_text(
+        ">seq\nNN" + "ACGT" * 3000 + "\n"
+    )
+    (ncbi_dir / Path("protein.faa")).write_text(">p\nMK\n")
+    output_dir = tmp_path / Path("genomes")
+    parsed_dir = tmp_path / Path("parsed")
+    download_genomes(
+        ["GCF_1.1"],
+        output_dir,
+        LocalDirectoryBackend(tmp_path / Path("ncbi")),
+        parsed_dir=parsed_dir,
+    )
+    assert [path.name for path in (output_dir / "GCF_1.1").iterdir()] == ["protein.faa"]
+    parsed_path = parsed_dir / Path("GCR_1.1_asm_genomic.fna")
+    assert Fasta.from_fasta_file(parsed_path).sequences == ["ACGT" * 3000]
+
+
+def test_clean_while_extracting_rejected(tmp_path: Path):
+    """Check that a genome out of the PGAP limits is reported and not kept."""
+    for accession, contig in [
+        ("GCF_1.1", "ACGT" * 3000),
+        ("GCF_2.1", "ACGT" * 2000 + "N" * 3000),
+    ]:
+        ncbi_dir = tmp_path / Path(f"ncbi/{accession}")
+        ncbi_dir.mkdir(parents=True)
+        (ncbi_dir / Path(f"{accession}_asm_genomic.fna")).write_text(
+            f">seq\n{contig}\n"
+        )
+    parsed_dir = tmp_path / Path("parsed")
+    report_path = tmp_path / Path("report.jsonl")
+    downloaded = download_genomes(
+        ["GCF_1.1", "GCF_2.1"],
+        tmp_path / Path("genomes"),
+        LocalDirectoryBackend(tmp_path / Path("ncbi")),
+        parsed_dir=parsed_dir,
+        report_path=report_path,
+    )
+    assert downloaded == {"GCF_1.1": True, "GCF_2.1": False}
+    assert [path.name for path in parsed_dir.iterdir()] == ["GCR_1.1_asm_genomic.fna"]
+    reports = [json.loads(line) for line in report_path.read_text().splitlines()]
+    assert [(report["genome"], report["status"]) for report in reports] == [
+        ("GCF_1.1_asm_genomic", "written"),
+        ("GCF_2.1_asm_genomic", "too short"),
+    ]
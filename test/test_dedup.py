@@ -0,0 +1,83 @@
+"""Test the detection of identical genomes."""
+
+from pathlib import Path
+from data_assembly.dedup import (
+    GenomeFingerprint,
+    group_identical,
+    group_identical_files,
+    link_dir,
+    link_file,
+)
+from data_assembly.fasta import CleaningReport, Fasta, fingerprint_fasta, parse_genome
+import pytest
+
+
+def test_genome_fingerprint():
+    """Check that a fingerprint depends on sequences only, not on their order."""
+    fingerprint = GenomeFingerprint()
+    fingerprint.start_contig()
+    for chunk in [b"ACG", b"T", b""]:
+        fingerprint.update(chunk)
+    fingerprint.end_contig()
+    fingerprint.start_contig()
+    fingerprint.update(b"NNNN")
+    fingerprint.end_contig(keep=False)
+    fingerprint.add_contig(b"GGCC")
+
+    other = GenomeFingerprint()
+    other.add_contig(b"GGCC")
+    other.add_contig(b"ACGT")
+    assert fingerprint.contigs == other.contigs[::-1]
+    assert fingerprint.genome == other.genome
+
+    other.add_contig(b"A")
+    assert fingerprint.genome != other.genome
+
+
+@pytest.mark.parametrize("chunk_size", [None, 7])
+def test_fingerprint_cleaned_genome(tmp_path: Path, chunk_size: int | None):
+    """Check that the fingerprint of a cleaned genome ignores titles and lines."""
+    contigs = ["NN" + "ACGT" * 3000, "ACGT" * 100, "GT" * 5000 + "N" * 20 + "CA" * 10]
+    reports = []
+    for i, line_width in enumerate([50, 80]):
+        genome_path = tmp_path / Path(f"GCF_{i}.1.fna")
+        titles = [f"contig_{i}_{j}" for j in range(len(contigs))]
+        Fasta(contigs, titles).to_fasta_file(genome_path, line_width=line_width)
+        report = CleaningReport(genome_path.stem)
+        output_path = parse_genome((genome_path, tmp_path), report, chunk_size)
+        assert fingerprint_fasta(output_path, chunk_size=5).genome == report.genome_hash
+        reports.append(report)
+    assert reports[0].genome_hash == reports[1].genome_hash
+    assert len(reports[0].contig_hashes) == 2
+    assert reports[0].to_dict()["contig_hashes"] == reports[0].contig_hashes
+
+
+def test_group_identical_files(tmp_path: Path):
+    """Check that files are grouped by content, in their order."""
+    contents = {"a": b"ACGT", "b": b"ACGA", "c": b"ACGT", "d": b"AC", "e": b"ACGT"}
+    paths = []
+    for name, content in contents.items():
+        paths.append(tmp_path / Path(name))
+        paths[-1].write_bytes(content)
+    groups = group_identical_files(paths)
+    assert {
+        path.name: [other.name for other in others] for path, others in groups.items()
+    } == {"a": ["c", "e"], "b": [], "d": []}
+    assert group_identical([1, 2, 3, 4], lambda i: i % 2) == {1: [3], 2: [4]}
+
+
+def test_link(tmp_path: Path):
+    """Check that results are linked to the paths of duplicates."""
+    source = tmp_path / Path("source.fna")
+    source.write_text(">a\nACGT\n")
+    target = tmp_path / Path("target.fna")
+    target.write_text("old")
+    link_file(source, target)
+    assert target.read_text() == source.read_text()
+
+    source_dir = tmp_path / Path("annotation")
+    source_dir.mkdir()
+    assert link_dir(source_dir, tmp_path / Path("duplicate"))
+    assert link_dir(source_dir, tmp_path / Path("duplicate"))
+    assert (tmp_path / Path("duplicate")).resolve() == source_dir
+    assert not link_dir(tmp_path / Path("duplicate"), source_dir)
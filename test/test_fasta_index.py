@@ -0,0 +1,54 @@
+"""Test the module indexing fasta files."""
+
+from pathlib import Path
+from data_assembly.fasta import Fasta
+from data_assembly.fasta_index import (
+    FaiRecord,
+    IndexedFasta,
+    build_fai,
+    genome_length,
+    get_fai_path,
+)
+import pytest
+
+
+@pytest.mark.parametrize(
+    "input_path",
+    [
+        Path(__file__).parent / Path("inputs/basic.fst"),
+        Path(__file__).parent / Path("inputs/multi_line.fst"),
+        Path(__file__).parent / Path("inputs/seq_too_short.fst"),
+    ],
+)
+def test_fetch(input_path: Path, tmp_path: Path):
+    """Check that indexed sequences are the same as the parsed ones."""
+    fasta_path = tmp_path / input_path.name
+    fasta_path.write_bytes(input_path.read_bytes())
+    fasta = Fasta.from_fasta_file(fasta_path)
+    with IndexedFasta(fasta_path) as indexed:
+        assert indexed.lengths == [len(seq) for seq in fasta.sequences]
+        assert indexed.genome_length == sum(map(len, fasta.sequences))
+        name = indexed.records[0].name
+        seq = fasta.sequences[0]
+        assert indexed.fetch(name) == seq.encode()
+        assert indexed.fetch(name, 3, 123) == seq[3:123].encode()
+    assert get_fai_path(fasta_path).exists()
+
+
+def test_build_fai(tmp_path: Path):
+    """Check the index against the one `samtools faidx` would write."""
+    fasta_path = tmp_path / Path("genome.fna")
+    fasta_path.write_text(">a desc\nACGT\nAC\n>b\nAAAA\nAAAA\n")
+    assert build_fai(fasta_path) == [
+        FaiRecord("a", 6, 8, 4, 5),
+        FaiRecord("b", 8, 19, 4, 5),
+    ]
+    assert genome_length(fasta_path) == 14
+
+
+def test_build_fai_different_line_length(tmp_path: Path):
+    """Check that sequences with lines of different lengths are rejected."""
+    fasta_path = tmp_path / Path("genome.fna")
+    fasta_path.write_text(">a\nACGT\nAC\nACGT\n")
+    with pytest.raises(ValueError):
+        build_fai(fasta_path)
@@ -1,7 +1,16 @@
 """Test the module FASTA file."""
 
 from pathlib import Path
-from data_assembly.fasta import Fasta
+from data_assembly.fasta import (
+    CleaningReport,
+    Fasta,
+    clean_genome,
+    clean_genome_chunked,
+    clean_records,
+    iter_fasta_chunks,
+    iter_fasta_records,
+    parse_genome,
+)
 import pytest
 
 
@@ -40,6 +49,13 @@ def test_parsing_fasta(
     assert fasta_file.titles == supposed_titles
 
 
+def test_iter_fasta_records():
+    """Check that records are yielded one by one in file order."""
+    records = iter_fasta_records(Path(__file__).parent / Path("inputs/multi_line.fst"))
+    assert next(records) == (" Line 0", "A" * 71)
+    assert [title for title, _ in records] == [" Line 1", " Line 2"]
+
+
 @pytest.mark.parametrize(
     "fasta_path, supposed_sequences, supposed_titles",
     [
@@ -147,3 +163,224 @@ def test_n_successif(input_path, expect_result):
     fasta = Fasta.from_fasta_file(input_path)
     fasta.reduce_successives_n()
     assert fasta.sequences == expect_result
+
+
+@pytest.mark.parametrize(
+    "sequences, limit, expect_result",
+    [
+        (["ANNNNN", "NNNNNA"], 5, ["ANNNNN", "NNNNNA"]),
+        (["ANNNNNNNA", "NNNNNNNNNN"], 2, ["ANNA", "NN"]),
+        (["ANNNA", "NA"], 0, ["AA", "A"]),
+    ],
+)
+def test_n_successif_limit(sequences, limit, expect_result):
+    """Check that runs of N are counted separately in each sequence."""
+    fasta = Fasta(sequences, [str(i) for i in range(len(sequences))])
+    fasta.reduce_successives_n(limit)
+    assert fasta.sequences == expect_result
+
+
+@pytest.mark.parametrize(
+    "input_path",
+    [
+        Path(__file__).parent / Path("inputs/n_successif.fst"),
+        Path(__file__).parent / Path("inputs/seq_n_start_n_end.fst"),
+        Path(__file__).parent / Path("inputs/seq_too_short.fst"),
+    ],
+)
+def test_clean_records(input_path):
+    """Check the single pass cleaning against the chain of `Fasta` methods."""
+    fasta = Fasta.from_fasta_file(input_path)
+    fasta.remove_first_last_n()
+    fasta.reduce_successives_n()
+    fasta.remove_seq_too_short(threshold=5)
+    records = list(clean_records(iter_fasta_records(input_path), threshold=5))
+    assert records == list(zip(fasta.titles, fasta.sequences))
+
+
+@pytest.mark.parametrize(
+    "input_path",
+    [
+        Path(__file__).parent / Path("inputs/basic.fst"),
+        Path(__file__).parent / Path("inputs/long_line_fasta.fst"),
+        Path(__file__).parent / Path("inputs/multi_line.fst"),
+        Path(__file__).parent / Path("inputs/seq_too_short.fst"),
+    ],
+)
+def test_clean_records_results(input_path, tmp_path):
+    """Check the single pass cleaning against the expected files in results.
+
+    These inputs have no N to remove, so that the cleaned genome is written
+    as the expected file.
+    """
+    records = list(clean_records(iter_fasta_records(input_path), threshold=1))
+    output_path = tmp_path / input_path.name
+    Fasta([seq for _, seq in records], [title for title, _ in records]).to_fasta_file(
+        output_path
+    )
+    expected_path = Path(__file__).parent / Path(f"results/{input_path.name}")
+    assert output_path.read_bytes() == expected_path.read_bytes()
+
+
+def test_parse_genome(tmp_path):
+    """Check that `parse_genome` writes the same file as the chain of methods."""
+    genome_path = tmp_path / Path("GCF_000001.1_genomic.fna")
+    contigs = [
+        "NNN" + "ACGT" * 1000 + "N" * 30 + "ACGT" * 1000 + "NN",
+        "ACGT" * 100,
+        "N" * 12 + "ACGT" * 2000 + "N" * 5 + "GT",
+    ]
+    Fasta(contigs, [f"contig_{i}" for i in range(3)]).to_fasta_file(genome_path)
+
+    expected = Fasta.from_fasta_file(genome_path)
+    expected.remove_first_last_n()
+    expected.reduce_successives_n()
+    expected.remove_seq_too_short()
+    assert expected.in_pgap_range
+    expected.to_fasta_file(tmp_path / Path("expected.fna"))
+
+    output_path = parse_genome((genome_path, tmp_path))
+    assert output_path == tmp_path / Path("GCR_000001.1_genomic.fna")
+    assert output_path.read_bytes() == (tmp_path / Path("expected.fna")).read_bytes()
+
+
+def test_cleaning_report(tmp_path):
+    """Check the counters of the cleaning of a genome."""
+    contigs = [
+        "NNN" + "ACGT" * 1000 + "N" * 30 + "ACGT" * 1000 + "N" * 20 + "A" * 4000,
+        "ACGT" * 100,
+        "N" * 12 + "ACGT" * 2000 + "N" * 5 + "GT",
+    ]
+    report = CleaningReport("genome")
+    records = list(
+        clean_records(zip(["a", "b", "c"], contigs), "genome", report=report)
+    )
+    assert report.to_dict() == {
+        "genome": "genome",
+        "status": "",
+        "contigs_in": 3,
+        "contigs_dropped": 1,
+        "bases_in": sum(map(len, contigs)),
+        "bases_trimmed": 15,
+        "n_runs_collapsed": 2,
+        "n_removed": 21 + 11,
+        "final_length": sum(len(seq) for _, seq in records),
+    }
+    assert CleaningReport.from_dict(report.to_dict()).to_tsv() == report.to_tsv()
+
+
+def test_parse_genome_too_short(tmp_path):
+    """Check that a genome out of the PGAP limits is not written."""
+    genome_path = tmp_path / Path("GCF_000002.1_genomic.fna")
+    contig = "ACGT" * 1000 + "N" * 3000 + "A"
+    Fasta([contig, contig], ["a", "b"]).to_fasta_file(genome_path)
+    report = CleaningReport(genome_path.stem)
+    assert parse_genome((genome_path, tmp_path), report) is None
+    assert report.status == "too short"
+    assert report.final_length == 0 and report.contigs_in == 2
+    assert list(tmp_path.iterdir()) == [genome_path]
+
+
+@pytest.mark.parametrize("line_width", [50, 7, 80])
+def test_write_replace(tmp_path, line_width):
+    """Check that writing a fasta replaces an existing file in one go."""
+    output_path = tmp_path / Path("genome.fna")
+    output_path.write_text("previous content")
+    fasta = Fasta(["ACGT" * 30, "A" * 7], ["first", "second"])
+    assert fasta.to_fasta_file(output_path, line_width=line_width) == output_path
+    assert list(tmp_path.iterdir()) == [output_path]
+    lines = output_path.read_text().splitlines()
+    assert lines[0] == ">first"
+    assert max(map(len, lines[1:])) == min(line_width, 120)
+    assert Fasta.from_fasta_file(output_path).sequences == fasta.sequences
+
+
+def test_n_first_last_all_n():
+    """Check that sequences made only of N are removed with their title."""
+    fasta = Fasta(["NNNN", "NNACGTNN", "", "ACGT"], ["a", "b", "c", "d"])
+    fasta.remove_first_last_n()
+    assert fasta.sequences == ["ACGT", "ACGT"]
+    assert fasta.titles == ["b", "d"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_iter_fasta_chunks(tmp_path, chunk_size):
+    """Check that chunks join back into the records of the file."""
+    fasta_path = tmp_path / Path("genome.fna")
+    fasta_path.write_bytes(
+        b"ignored\n>first contig\r\nACGT\r\nAC\n>empty\n>last\nNNNN\nGT"
+    )
+    records = []
+    for title, chunk in iter_fasta_chunks(fasta_path, chunk_size):
+        assert len(chunk) <= chunk_size
+        if title is not None:
+            records.append([title, b""])
+        else:
+            records[-1][1] += chunk
+    assert records == [
+        ["first contig", b"ACGTAC"],
+        ["empty", b""],
+        ["last", b"NNNNGT"],
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [5, 64, 1000, 1 << 20])
+def test_clean_genome_chunked(tmp_path, chunk_size):
+    """Check that a genome cleaned by chunks is the same as cleaned at once."""
+    genome_path = tmp_path / Path("GCF_000001.1_genomic.fna")
+    contigs = [
+        "NNN" + "ACGT" * 1000 + "N" * 3000 + "ACGT" * 1000 + "N" * 5 + "A" * 5,
+        "ACGT" * 100,
+        "N" * 12 + "ACGT" * 2000 + "N" * 10 + "GT" + "N" * 700,
+        "N" * 5000,
+        "ACGTN" * 1000,
+    ]
+    Fasta(contigs, [f"contig_{i}" for i in range(5)]).to_fasta_file(
+        genome_path, line_width=70
+    )
+    expected_report = CleaningReport(genome_path.stem)
+    expected_path = parse_genome((genome_path, tmp_path), expected_report)
+    expected_path = expected_path.rename(tmp_path / Path("expected.fna"))
+
+    report = CleaningReport(genome_path.stem)
+    output_path = tmp_path / Path("chunked.fna")
+    assert (
+        clean_genome_chunked(
+            genome_path, output_path, genome_path.stem, report, chunk_size
+        )
+        == output_path
+    )
+    assert output_path.read_bytes() == expected_path.read_bytes()
+    assert report.to_dict() == expected_report.to_dict()
+
+
+def test_clean_genome_chunked_too_short(tmp_path):
+    """Check that a genome out of the PGAP limits is not left behind."""
+    genome_path = tmp_path / Path("genome.fna")
+    Fasta(["ACGT" * 1000], ["a"]).to_fasta_file(genome_path)
+    report = CleaningReport()
+    output_path = tmp_path / Path("out") / Path("genome.fna")
+    output_path.parent.mkdir()
+    assert clean_genome_chunked(genome_path, output_path, report=report) is None
+    assert report.status == "too short"
+    assert report.final_length == 0
+    assert list(output_path.parent.iterdir()) == []
+
+
+def test_clean_genome_chunked_too_long(tmp_path, monkeypatch):
+    """Check that a genome is abandoned once past the upper PGAP limit."""
+    monkeypatch.setattr("data_assembly.fasta.PGAP_MAX_GENOME_LEN", 5000)
+    genome_path = tmp_path / Path("genome.fna")
+    Fasta(["ACGT" * 1000, "ACGT" * 1000], ["a", "b"]).to_fasta_file(genome_path)
+    report = CleaningReport()
+    output_path = tmp_path / Path("out.fna")
+    assert clean_genome_chunked(genome_path, output_path, None, report, 64) is None
+    assert report.status == "too long"
+    assert report.final_length == 0
+    assert list(tmp_path.iterdir()) == [genome_path]
+
+    report = CleaningReport()
+    records = iter_fasta_records(genome_path)
+    assert clean_genome(records, output_path, None, report) is None
+    assert report.status == "too long" and report.final_length == 0
+    assert list(tmp_path.iterdir()) == [genome_path]
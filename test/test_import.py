@@ -0,0 +1,91 @@
+"""Test that importing the package is cheap and free of side effects."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+
+SRC_DIR = Path(__file__).parents[1] / Path("src")
+HEAVY_MODULES = ["yaml", "asyncio", "cProfile", "tracemalloc", "multiprocessing"]
+CHECK_IMPORT = """
+import json, logging, sys
+import {module}
+print(json.dumps({{
+    "modules": [name for name in {heavy!r} if name in sys.modules],
+    "handlers": len(logging.getLogger().handlers),
+}}))
+"""
+# Budget of the import of the fasta module, in milliseconds, on top of the
+# standard modules every module of the package needs, see
+# `benchmarks/bench_import.py`.
+FASTA_IMPORT_BUDGET_MS = 10.0
+
+
+@pytest.mark.parametrize(
+    "module", ["data_assembly.fasta", "data_assembly.pgap", "data_assembly.data_getter"]
+)
+def test_import_side_effects(tmp_path: Path, module: str):
+    """Check that an import neither configures logging, writes files nor loads
+    heavy dependencies."""
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR), PYTHONDONTWRITEBYTECODE="1")
+    script = CHECK_IMPORT.format(module=module, heavy=HEAVY_MODULES)
+    stdout = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert json.loads(stdout) == {"modules": [], "handlers": 0}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_import_budget(tmp_path: Path):
+    """Check that the fasta module imports within its budget, best of 5.
+
+    The bytecode is written in `tmp_path` by the first import, so that the
+    budget is checked on compiled modules like in a real run.
+    """
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR), PYTHONPYCACHEPREFIX=str(tmp_path))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    script = (
+        "import logging, pathlib, re, sys, typing\n"
+        "print('preloaded', file=sys.stderr)\n"
+        "import data_assembly.fasta\n"
+    )
+    times = []
+    for _ in range(5):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stderr
+        line = stderr.split("preloaded\n")[1].splitlines()[-1]
+        assert line.endswith("| data_assembly.fasta")
+        times.append(int(line.split("|")[1]) / 1e3)
+    assert min(times) <= FASTA_IMPORT_BUDGET_MS
+
+
+def test_configure_logging(tmp_path: Path):
+    """Check that the logs go in the file given to the command line."""
+    log_file = tmp_path / Path("log/data_assembly.log")
+    script = (
+        "import logging, sys\n"
+        "from pathlib import Path\n"
+        "from data_assembly.cli import configure_logging\n"
+        "configure_logging(1, Path(sys.argv[1]))\n"
+        "logging.getLogger('data_assembly.fasta').info('cleaned')\n"
+        "logging.getLogger('data_assembly.fasta').debug('hidden')\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script, str(log_file)],
+        env=dict(os.environ, PYTHONPATH=str(SRC_DIR)),
+        check=True,
+    )
+    log = log_file.read_text()
+    assert "INFO data_assembly.fasta: cleaned" in log and "hidden" not in log
@@ -0,0 +1,54 @@
+"""Test the creation of PGAP inputs."""
+
+from pathlib import Path
+import yaml
+from data_assembly.fasta import Fasta
+from data_assembly.pgap import (
+    INPUT_YAML,
+    SUBMOL_YAML,
+    create_input_pgap,
+    get_pgap_cache_key,
+    load_templates,
+    remove_input_pgap,
+)
+
+
+def test_create_input_pgap(tmp_path: Path):
+    """Check that each run gets its own inputs, with the genome linked."""
+    genome_path = tmp_path / Path("GCR_1.1.fna")
+    Fasta(["ACGT" * 100], ["seq"]).to_fasta_file(genome_path)
+    scratch_dir = tmp_path / Path("scratch")
+    scratch_dir.mkdir()
+
+    input_dirs = [
+        create_input_pgap(genome_path, "Genus species", "A", scratch_dir)
+        for _ in range(2)
+    ]
+    assert input_dirs[0] != input_dirs[1]
+    with (input_dirs[0] / Path(INPUT_YAML)).open("r") as f:
+        input_yaml = yaml.safe_load(f)
+    fasta_path = Path(input_yaml["fasta"]["location"])
+    assert fasta_path.parent == input_dirs[0]
+    assert fasta_path.samefile(genome_path)
+    with Path(input_yaml["submol"]["location"]).open("r") as f:
+        assert yaml.safe_load(f)["organism"]["strain"] == "A"
+    assert input_yaml["submol"]["location"].endswith(SUBMOL_YAML)
+
+    # The templates are only read once and never changed by the rendering.
+    assert load_templates.cache_info().hits >= 1
+    assert load_templates()[0]["fasta"]["location"] is None
+
+    for input_dir in input_dirs:
+        remove_input_pgap(input_dir)
+    assert list(scratch_dir.iterdir()) == []
+    assert genome_path.exists()
+
+
+def test_pgap_cache_key(tmp_path: Path):
+    """Check that the cache key depends on the inputs, not on the scratch dir."""
+    genome_path = tmp_path / Path("GCR_1.1.fna")
+    genome_path.write_text(">seq\nACGT\n")
+    output_path = tmp_path / Path("GCR_1.1")
+    key = get_pgap_cache_key(genome_path, "Genus species", "A", output_path)
+    assert key == get_pgap_cache_key(genome_path, "Genus species", "A", output_path)
+    assert key != get_pgap_cache_key(genome_path, "Genus species", "B", output_path)
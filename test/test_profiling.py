@@ -0,0 +1,122 @@
+"""Test the timing and profiling of the stages of the pipeline."""
+
+import json
+import pstats
+from pathlib import Path
+from data_assembly.cli import main
+from data_assembly.fasta import Fasta
+from data_assembly.profiling import (
+    PROFILE_DIR_ENV,
+    PROFILE_ENV,
+    drain_events,
+    enable_timings,
+    export_timings,
+    profiling,
+    summarize,
+    timed,
+    timings_enabled,
+)
+import pytest
+
+
+@pytest.fixture
+def timings():
+    """Record timings during a test."""
+    enabled = timings_enabled()
+    enable_timings()
+    drain_events()
+    yield
+    drain_events()
+    enable_timings(enabled)
+
+
+@timed("double")
+def double(x: int) -> int:
+    return 2 * x
+
+
+def test_timed(timings):
+    """Check that blocks and decorated calls are recorded as events."""
+    with timed("block", genome="GCF_1.1"):
+        assert double(1) == 2
+    assert double(2) == 4
+    events = drain_events()
+    assert [event.name for event in events] == ["double", "block", "double"]
+    assert events[1].args == {"genome": "GCF_1.1"}
+    assert events[1].duration >= events[0].duration
+    assert summarize(events)["double"]["count"] == 2
+    assert drain_events() == []
+
+
+def test_profiling(tmp_path: Path, monkeypatch, timings):
+    """Check that profiles are only captured when enabled by the environment."""
+    monkeypatch.setenv(PROFILE_DIR_ENV, str(tmp_path))
+    with profiling("disabled"):
+        double(1)
+    assert list(tmp_path.iterdir()) == []
+
+    monkeypatch.setenv(PROFILE_ENV, "cprofile,tracemalloc")
+    drain_events()
+    with profiling("stage"):
+        double(1)
+    (prof_path,) = tmp_path.glob("stage.*.prof")
+    assert any("double" in name for _, _, name in pstats.Stats(str(prof_path)).stats)
+    assert len(list(tmp_path.glob("stage.*.tracemalloc.txt"))) == 1
+    assert [event.name for event in drain_events()] == ["double", "stage.memory"]
+
+
+def test_clean_timings(tmp_path: Path, capsys, timings):
+    """Check that timings of worker processes are exported by `clean`."""
+    in_dir = tmp_path / Path("genomes")
+    in_dir.mkdir()
+    for i in range(2):
+        # Distinct titles, or the second genome would be cleaned as a duplicate.
+        Fasta(["ACGT" * 5000], [f"seq_{i}"]).to_fasta_file(
+            in_dir / Path(f"GCF_{i}.1.fna")
+        )
+    timings_path = tmp_path / Path("timings.json")
+    drain_events()
+    main(
+        [
+            "clean",
+            str(in_dir),
+            str(tmp_path / Path("parsed")),
+            "--jobs",
+            "2",
+            "--timings",
+            str(timings_path),
+        ]
+    )
+    with timings_path.open("r") as f:
+        timings = json.load(f)
+    assert timings["summary"]["clean"]["count"] == 2
+    assert timings["summary"]["parse_genome"]["count"] == 2
+    genomes = {
+        event["args"]["genome"]
+        for event in timings["traceEvents"]
+        if event["name"] == "clean_genome"
+    }
+    assert genomes == {"GCF_0.1", "GCF_1.1"}
+
+
+def test_export_timings(tmp_path: Path, timings):
+    """Check that exported timings are a Chrome trace."""
+    with timed("stage"):
+        pass
+    output_path = tmp_path / Path("trace.json")
+    export_timings(drain_events(), output_path)
+    with output_path.open("r") as f:
+        (event,) = json.load(f)["traceEvents"]
+    assert event["ph"] == "X" and event["ts"] == 0 and event["name"] == "stage"
+
+
+def test_timings_disabled():
+    """Check that nothing is recorded while timings are disabled."""
+    enabled = timings_enabled()
+    enable_timings(False)
+    try:
+        with timed("block"):
+            assert double(1) == 2
+        assert drain_events() == []
+    finally:
+        enable_timings(enabled)
@@ -0,0 +1,48 @@
+"""Test the quality metrics of genomes."""
+
+from pathlib import Path
+import pytest
+from data_assembly.cli import main
+from data_assembly.fasta import Fasta
+from data_assembly.qc import fasta_qc, genome_file_qc, get_n50, get_qc_header
+
+
+def test_get_n50():
+    """Check the N50 and L50 of contig lengths."""
+    assert get_n50([2, 3, 4, 5, 6, 7, 8, 9, 10]) == (8, 3)
+    assert get_n50([10]) == (10, 1)
+    assert get_n50([]) == (0, 0)
+
+
+@pytest.mark.parametrize("storage", ["str", "bytes"])
+def test_fasta_qc(storage):
+    """Check the metrics of a small genome."""
+    fasta = Fasta.from_records(
+        [
+            ("a", "GGCC" + "N" * 5 + "AATT" + "N" * 12 + "atgc"),
+            ("b", "GC" + "n" * 150 + "GC" + "N" * 1000),
+            ("c", "ACGT"),
+        ],
+        "genome",
+        storage,
+    )
+    qc = fasta_qc(fasta)
+    assert qc.genome == "genome"
+    assert (qc.contigs, qc.length, qc.min_contig, qc.max_contig) == (3, 1187, 4, 1154)
+    assert (qc.n50, qc.l50) == (1154, 1)
+    assert qc.gc == pytest.approx(12 / 20)
+    assert qc.n_fraction == pytest.approx(1167 / 1187)
+    assert qc.gaps == (1, 1, 1, 1, 0)
+
+
+def test_qc_command(tmp_path: Path, capsys):
+    """Check that `qc` writes one line of metrics by genome."""
+    for i in range(3):
+        fasta = Fasta(["ACGT" * (i + 1) * 100, "GGNNCC"], ["a", "b"])
+        fasta.to_fasta_file(tmp_path / Path(f"GCF_{i}.1.fna"))
+    assert main(["qc", str(tmp_path), "--jobs", "2"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split("\t") == get_qc_header()
+    assert len(lines) == 4
+    assert lines[1].split("\t")[:3] == ["GCF_2.1", "2", "1206"]
+    assert genome_file_qc(tmp_path / Path("GCF_0.1.fna")).gc == pytest.approx(204 / 404)
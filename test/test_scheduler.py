@@ -0,0 +1,254 @@
+"""Test the scheduler of PGAP runs against a stub of `pgap.py`."""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from data_assembly.cli import main
+from data_assembly.fasta import Fasta, fingerprint_fasta
+from data_assembly.scheduler import (
+    AsyncPgapScheduler,
+    JobCost,
+    PgapJob,
+    PgapScheduler,
+    estimate_genome_length,
+    get_cleaned_fingerprints,
+)
+import pytest
+
+STUB_PGAP = f"""#!{sys.executable}
+import argparse, json, os, time
+from pathlib import Path
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-n", action="store_true")
+parser.add_argument("-d", action="store_true")
+parser.add_argument("--cpus", type=int)
+parser.add_argument("--memory")
+parser.add_argument("-o")
+parser.add_argument("input_yaml")
+args = parser.parse_args()
+assert Path(args.input_yaml).is_file()
+log = Path(args.o).parent / "runs.jsonl"
+name = Path(args.o).name
+(Path(args.o).parent / (name + ".pid")).write_text(str(os.getpid()))
+print("Annotating " + name, flush=True)
+if "slow" in name:
+    time.sleep(30)
+if "flaky" in name and not (Path(args.o).parent / "flaky.marker").exists():
+    (Path(args.o).parent / "flaky.marker").touch()
+    raise SystemExit(1)
+start = time.time()
+time.sleep(0.2)
+with log.open("a") as f:
+    f.write(json.dumps([args.o, args.cpus, args.memory, start, time.time()]) + "\\n")
+if "fail" in args.o:
+    raise SystemExit(3)
+Path(args.o).mkdir()
+"""
+
+
+@pytest.fixture
+def stub_pgap(tmp_path: Path) -> Path:
+    pgap_path = tmp_path / Path("pgap.py")
+    pgap_path.write_text(STUB_PGAP)
+    pgap_path.chmod(0o755)
+    return pgap_path
+
+
+def test_scheduler(tmp_path: Path, stub_pgap: Path):
+    """Check that jobs run within the budgets, biggest first, and are cached."""
+    jobs = []
+    for i, (name, size) in enumerate([("small", 1), ("fail", 2), ("big", 3)]):
+        genome_path = tmp_path / Path(f"GCR_sched_test_{i}.fna")
+        Fasta(["A" * size * 100], ["seq"]).to_fasta_file(genome_path)
+        jobs.append(PgapJob(genome_path, "strain", "Genus species", tmp_path / name))
+
+    scratch_dir = tmp_path / Path("scratch")
+    scratch_dir.mkdir()
+    scheduler = PgapScheduler(
+        cpus=4,
+        memory_gb=10,
+        pgap_executable=stub_pgap,
+        poll_interval=0.01,
+        estimate_cost=lambda genome_len: JobCost(
+            genome_len // 100, 3 * genome_len // 100
+        ),
+        scratch_dir=scratch_dir,
+    )
+    results = scheduler.run(jobs)
+    assert {result.job.output_path.name: result.returncode for result in results} == {
+        "small": 0,
+        "fail": 3,
+        "big": 0,
+    }
+    assert all(result.wall_time >= 0.2 for result in results)
+    runs = {
+        Path(run[0]).name: run[1:]
+        for run in map(json.loads, (tmp_path / "runs.jsonl").read_text().splitlines())
+    }
+    # The big job starts first and runs alone, the two others fit together.
+    assert runs["big"][:2] == [3, "9g"]
+    assert runs["big"][3] <= min(runs["small"][2], runs["fail"][2])
+    assert runs["small"][2] < runs["fail"][3] and runs["fail"][2] < runs["small"][3]
+    assert (tmp_path / "big").is_dir()
+    assert list(scratch_dir.iterdir()) == []
+
+    results = scheduler.run(jobs)
+    assert sorted(
+        (result.job.output_path.name, result.returncode) for result in results
+    ) == [("big", None), ("fail", 3), ("small", None)]
+
+
+def make_jobs(tmp_path: Path, names: list[str]) -> list[PgapJob]:
+    """Create a small genome to annotate for each name."""
+    jobs = []
+    for i, name in enumerate(names):
+        genome_path = tmp_path / Path(f"GCR_async_test_{i}.fna")
+        # Distinct genomes, or they would be annotated once as duplicates.
+        Fasta(["A" * 100 + "C" * i], ["seq"]).to_fasta_file(genome_path)
+        jobs.append(PgapJob(genome_path, "strain", "Genus species", tmp_path / name))
+    return jobs
+
+
+def test_async_scheduler(tmp_path: Path, stub_pgap: Path):
+    """Check the timeouts, retries, logs and progress of the async scheduler."""
+    scratch_dir = tmp_path / Path("scratch")
+    scratch_dir.mkdir()
+    progress = []
+    scheduler = AsyncPgapScheduler(
+        cpus=4,
+        memory_gb=16,
+        pgap_executable=stub_pgap,
+        estimate_cost=lambda genome_len: JobCost(1, 1),
+        scratch_dir=scratch_dir,
+        timeout=1.0,
+        retries=1,
+        backoff=0.01,
+        on_result=lambda result, n_done, n_jobs: progress.append((n_done, n_jobs)),
+    )
+    results = scheduler.run(make_jobs(tmp_path, ["ok", "fail", "flaky", "slow"]))
+    outcomes = {
+        result.job.output_path.name: (result.returncode, result.attempts)
+        for result in results
+    }
+    assert outcomes["ok"] == (0, 1)
+    assert outcomes["fail"] == (3, 2)
+    assert outcomes["flaky"] == (0, 2)
+    assert outcomes["slow"][0] < 0 and outcomes["slow"][1] == 2
+    assert progress == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert list(scratch_dir.iterdir()) == []
+
+    log = (tmp_path / Path("slow.log")).read_text()
+    assert log.count("Annotating slow") == 2
+    assert "# Attempt 2:" in log and "# Killed after 1.0 s" in log
+
+    # Successful runs are cached, the failed ones run again.
+    results = scheduler.run(make_jobs(tmp_path, ["ok", "fail"]))
+    assert sorted(result.returncode or 0 for result in results) == [0, 3]
+    assert [result.returncode for result in results][0] is None
+
+
+def test_async_scheduler_cancel(tmp_path: Path, stub_pgap: Path):
+    """Check that cancelling the scheduler kills PGAP and removes its inputs."""
+    scratch_dir = tmp_path / Path("scratch")
+    scratch_dir.mkdir()
+    scheduler = AsyncPgapScheduler(
+        cpus=4,
+        memory_gb=16,
+        pgap_executable=stub_pgap,
+        estimate_cost=lambda genome_len: JobCost(1, 1),
+        scratch_dir=scratch_dir,
+    )
+
+    async def run_and_cancel():
+        task = asyncio.create_task(
+            scheduler.run_async(make_jobs(tmp_path, ["slow_1", "slow_2"]))
+        )
+        while len(list(tmp_path.glob("*.pid"))) < 2:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run_and_cancel())
+    for pid_path in tmp_path.glob("*.pid"):
+        with pytest.raises(ProcessLookupError):
+            os.kill(int(pid_path.read_text()), 0)
+    assert list(scratch_dir.iterdir()) == []
+
+
+def test_scheduler_duplicates(tmp_path: Path, stub_pgap: Path):
+    """Check that identical genomes are annotated once and linked."""
+    jobs = []
+    for name, title, genus_species, strain in [
+        ("gcf", "NZ_CP000001.1", "Genus species", "strain"),
+        ("gca", "CP000001.1", "Genus species", "strain"),
+        ("other", "CP000001.1", "Genus other", "strain"),
+        ("strain", "CP000001.1", "Genus species", "other strain"),
+    ]:
+        genome_path = tmp_path / Path(f"GCR_{name}.fna")
+        Fasta(["ACGT" * 100], [title]).to_fasta_file(genome_path)
+        jobs.append(PgapJob(genome_path, strain, genus_species, tmp_path / name))
+    scheduler = AsyncPgapScheduler(
+        cpus=4,
+        memory_gb=16,
+        pgap_executable=stub_pgap,
+        estimate_cost=lambda genome_len: JobCost(1, 1),
+    )
+    results = scheduler.run(jobs)
+    assert {result.job.output_path.name: result.duplicate_of for result in results} == {
+        "gcf": None,
+        "gca": jobs[0].genome_path,
+        "other": None,
+        "strain": None,
+    }
+    assert all(result.returncode == 0 for result in results)
+    runs = (tmp_path / "runs.jsonl").read_text().splitlines()
+    assert sorted(Path(json.loads(run)[0]).name for run in runs) == [
+        "gcf",
+        "other",
+        "strain",
+    ]
+    assert (tmp_path / "gca").is_symlink()
+    assert (tmp_path / "gca").resolve() == (tmp_path / "gcf").resolve()
+
+
+def test_estimate_genome_length(tmp_path: Path):
+    """Check that a genome which cannot be indexed gets a length estimate."""
+    genome_path = tmp_path / Path("genome.fna")
+    Fasta(["ACGT" * 100], ["seq"]).to_fasta_file(genome_path)
+    assert estimate_genome_length(genome_path) == 400
+    genome_path.write_text(">seq\nACGT\nACGTACGT\nAC\n")
+    assert estimate_genome_length(genome_path) == genome_path.stat().st_size
+
+
+def test_cleaned_fingerprints(tmp_path: Path):
+    """Check that fingerprints are taken from the reports of cleaned genomes."""
+    in_dir = tmp_path / Path("genomes")
+    in_dir.mkdir()
+    for i in range(2):
+        Fasta(["ACGT" * 5000], [f"seq_{i}"]).to_fasta_file(
+            in_dir / Path(f"GCF_{i}.1.fna")
+        )
+    out_dir = tmp_path / Path("parsed")
+    main(["clean", str(in_dir), str(out_dir)])
+    genome_paths = sorted(out_dir.glob("*.fna"))
+    fingerprints = get_cleaned_fingerprints([out_dir])
+    assert fingerprints == {
+        path.resolve(): fingerprint_fasta(path).genome for path in genome_paths
+    }
+
+    # A genome changed since it was cleaned is fingerprinted from its file.
+    Fasta(["ACGT" * 5000 + "A"], ["seq"]).to_fasta_file(genome_paths[0])
+    os.utime(genome_paths[0], (time.time() + 10, time.time() + 10))
+    assert list(get_cleaned_fingerprints([out_dir])) == [genome_paths[1].resolve()]
+
+    jobs = [
+        PgapJob(path, "strain", "Genus species", tmp_path / path.stem)
+        for path in [*genome_paths, tmp_path / Path("missing.fna")]
+    ]
+    groups = PgapScheduler()._group_identical(jobs)
+    assert groups == {jobs[0]: [], jobs[1]: [], jobs[2]: []}
@@ -0,0 +1,63 @@
+"""Test the module storing sequences in a single buffer."""
+
+from pathlib import Path
+from data_assembly.fasta import Fasta
+from data_assembly.sequence_store import PackedSequence, SequenceStore
+import pytest
+
+
+@pytest.mark.parametrize(
+    "input_path",
+    [
+        Path(__file__).parent / Path("inputs/multi_line.fst"),
+        Path(__file__).parent / Path("inputs/n_successif.fst"),
+        Path(__file__).parent / Path("inputs/seq_n_start_n_end.fst"),
+        Path(__file__).parent / Path("inputs/seq_too_short.fst"),
+    ],
+)
+def test_bytes_storage(input_path: Path):
+    """Check that cleaning a `SequenceStore` gives the same as a list."""
+    expected = Fasta.from_fasta_file(input_path)
+    fasta = Fasta.from_fasta_file(input_path, storage="bytes")
+    assert isinstance(fasta.sequences, SequenceStore)
+    for method, args in [
+        ("remove_first_last_n", ()),
+        ("reduce_successives_n", (3,)),
+        ("remove_seq_too_short", (5,)),
+    ]:
+        getattr(expected, method)(*args)
+        getattr(fasta, method)(*args)
+        assert list(fasta.sequences) == expected.sequences
+        assert fasta.titles == expected.titles
+
+
+def test_select_does_not_copy():
+    """Check that trimming and filtering only change the spans."""
+    store = SequenceStore.from_sequences(["NNACGTN", "NNNN", "ACGT"])
+    trimmed = store.strip_n().select([0, 2])
+    assert trimmed.buffer is store.buffer
+    assert list(trimmed) == ["ACGT", "ACGT"]
+    assert bytes(trimmed.view(0)) == b"ACGT"
+    assert list(trimmed.compact()) == ["ACGT", "ACGT"]
+
+
+@pytest.mark.parametrize(
+    "seq",
+    ["", "ACGT", "N" * 5, "NNAN", "A" + "N" * 100 + "C", "AN" + "NA" * 50 + "N" * 300],
+)
+def test_strip_n(seq: str):
+    """Check that first and last N are removed, however long their runs."""
+    store = SequenceStore.from_sequences(["NACGN", seq, "NNNN"])
+    assert list(store.strip_n()) == ["ACG", seq.strip("N"), ""]
+
+
+@pytest.mark.parametrize(
+    "seq",
+    [b"", b"A", b"ACGTTGCA", b"NNACGTNNNNRYACG", b"acgtNNNNNNNNNNNNNNNNNNNNNACGTA"],
+)
+def test_packed_sequence(seq: bytes):
+    """Check that packing a sequence on 2 bits keeps all its characters."""
+    packed = PackedSequence.from_bytes(seq)
+    assert len(packed) == len(seq)
+    assert len(packed.packed) == (len(seq) + 3) // 4
+    assert packed.to_bytes() == seq